@@ -0,0 +1,83 @@
+import copy
+import threading
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    In-memory cache of chat responses matched by query embedding similarity.
+
+    A stored response is reused when a new query over the same set of
+    namespaces is within the cosine threshold of a previously answered one.
+    Each entry remembers the version (e.g. vector count) of every namespace
+    at answer time, and is dropped as soon as any of those versions changes.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=256):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.entries = []
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _unit(self, embedding):
+        """Convert an embedding to a unit-length float32 vector"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def invalidate_changed(self, namespace_counts):
+        """Drop entries answered against namespaces whose version has since changed"""
+        with self.lock:
+            self.entries = [
+                entry for entry in self.entries
+                if all(namespace_counts.get(ns) == count for ns, count in entry["namespace_counts"].items())
+            ]
+
+    def lookup(self, embedding, namespace_counts, mode="qa"):
+        """Return a copy of the best cached response above the threshold, or None"""
+        if self.max_entries <= 0:
+            return None
+
+        self.invalidate_changed(namespace_counts)
+        namespaces = frozenset(namespace_counts)
+
+        with self.lock:
+            candidates = [
+                entry for entry in self.entries
+                if entry["mode"] == mode and entry["namespaces"] == namespaces
+            ]
+            if not candidates:
+                self.misses += 1
+                return None
+
+            similarities = np.stack([entry["embedding"] for entry in candidates]) @ self._unit(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return copy.deepcopy(candidates[best]["response"])
+
+    def store(self, embedding, namespace_counts, response, mode="qa"):
+        """Remember a response, evicting the oldest entry when full"""
+        if self.max_entries <= 0:
+            return
+
+        with self.lock:
+            self.entries.append({
+                "embedding": self._unit(embedding),
+                "namespaces": frozenset(namespace_counts),
+                "namespace_counts": dict(namespace_counts),
+                "mode": mode,
+                "response": copy.deepcopy(response)
+            })
+            if len(self.entries) > self.max_entries:
+                self.entries.pop(0)
+
+    def clear(self):
+        """Remove every cached response"""
+        with self.lock:
+            self.entries = []
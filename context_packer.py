@@ -0,0 +1,75 @@
+from text_match import merge_windows
+
+# Rough characters-per-token ratio for English text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Estimate the token count of a piece of text (about four characters per token)"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def chunk_snippets(text, contexts):
+    """
+    Merge a chunk's snippets into non-overlapping excerpts of its text.
+
+    Snippets are located in the chunk text and overlapping or touching ones
+    are joined, so shared characters are only sent once. Snippets that are
+    not a verbatim part of the text are kept as they are.
+    """
+    occurrences = []
+    loose = []
+    for context in contexts:
+        if not context:
+            continue
+        # Truncated previews end in "..." which is not part of the text
+        snippet = context[:-3] if context.endswith("...") else context
+        start = text.find(snippet) if text else -1
+        if start < 0:
+            loose.append(context)
+        else:
+            occurrences.append((start, start + len(snippet), None))
+
+    excerpts = [text[start:end] for start, end in merge_windows(occurrences, len(text), radius=0)]
+    return excerpts + [context for context in dict.fromkeys(loose) if context not in excerpts]
+
+
+def pack_contexts(results, budget):
+    """
+    Fit retrieved results into a token budget.
+
+    Results for the same chunk are combined and their snippets merged, then
+    chunks are taken in order of score and snippets added until the budget
+    is spent. A snippet that does not fit is skipped so smaller ones from
+    lower-ranked chunks can still use the remaining budget.
+
+    Returns:
+        tuple: (results with their contexts trimmed to the budget, estimated tokens used)
+    """
+    chunks = {}
+    for result in results:
+        key = (result.get('namespace'), result['id'])
+        chunk = chunks.get(key)
+        if chunk is None:
+            chunks[key] = dict(result, contexts=list(result.get('contexts', [])),
+                               matching_terms=list(result.get('matching_terms', [])))
+        else:
+            chunk['contexts'].extend(result.get('contexts', []))
+            chunk['matching_terms'].extend(term for term in result.get('matching_terms', [])
+                                           if term not in chunk['matching_terms'])
+            chunk['score'] = max(chunk['score'], result['score'])
+
+    packed = []
+    used = 0
+    for chunk in sorted(chunks.values(), key=lambda x: x['score'], reverse=True):
+        kept = []
+        for snippet in chunk_snippets(chunk.get('text', ''), chunk['contexts']):
+            cost = estimate_tokens(snippet)
+            if used + cost > budget:
+                continue
+            kept.append(snippet)
+            used += cost
+        if kept:
+            packed.append(dict(chunk, contexts=kept))
+
+    return packed, used
@@ -0,0 +1,55 @@
+import time
+
+
+class Deadline:
+    """
+    Latency budget of one request.
+
+    Each pipeline stage takes its own, shorter deadline with stage(), which
+    never ends later than the request's. A Deadline without a budget never
+    expires, so callers can pass one around unconditionally.
+    """
+
+    def __init__(self, seconds=None, expires_at=None):
+        if expires_at is None and seconds:
+            expires_at = time.monotonic() + seconds
+        self.expires_at = expires_at
+
+    @property
+    def limited(self):
+        """Whether this deadline can expire"""
+        return self.expires_at is not None
+
+    def remaining(self):
+        """Seconds left (never negative), or None when unlimited"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        """Whether the time is up"""
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def stage(self, seconds):
+        """Deadline for a stage allowed at most seconds from now (0 or None: no extra limit)"""
+        if not seconds:
+            return self
+        stage_end = time.monotonic() + seconds
+        if self.expires_at is not None:
+            stage_end = min(stage_end, self.expires_at)
+        return Deadline(expires_at=stage_end)
+
+    def at_least(self, seconds):
+        """Deadline pushed back, if needed, to leave at least seconds from now (0 or None: unchanged)"""
+        if self.expires_at is None or not seconds:
+            return self
+        return Deadline(expires_at=max(self.expires_at, time.monotonic() + seconds))
+
+    def cap(self, seconds):
+        """Shorten a timeout in seconds so it ends by the deadline"""
+        remaining = self.remaining()
+        return seconds if remaining is None else min(seconds, remaining)
+
+
+# Shared deadline for calls made without a latency budget
+NO_DEADLINE = Deadline()
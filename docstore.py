@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import hashlib
+import threading
+
+# Local directory for on-disk retrieval data (indexes, caches)
+DATA_DIR = os.getenv("PARALEGAL_DATA_DIR", "index_data")
+DEFAULT_DOCSTORE_PATH = os.path.join(DATA_DIR, "docstore.sqlite")
+
+
+def content_hash(text):
+    """SHA-256 hex digest of a chunk's text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ChunkDocstore:
+    """
+    Content-addressed SQLite store of chunk text keyed by vector ID.
+
+    Vector store metadata stays small: the chatbot looks up the text of the
+    final top-k chunks here in one batch instead of receiving every match's
+    text with the query. Texts are stored once per content hash, so the same
+    chunk uploaded to several namespaces is kept only once.
+    """
+
+    def __init__(self, path=DEFAULT_DOCSTORE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.conn:
+            self.conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS texts (hash TEXT PRIMARY KEY, text TEXT NOT NULL) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS chunks (
+                    namespace TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    PRIMARY KEY (namespace, id)
+                ) WITHOUT ROWID;
+            """)
+
+    def put(self, namespace, records):
+        """
+        Store chunk texts for a vector store namespace, replacing any with the same ID.
+
+        Args:
+            namespace: Vector store namespace the chunks were uploaded to
+            records: Iterable of (id, text) tuples
+        """
+        rows = [(chunk_id, text, content_hash(text)) for chunk_id, text in records if text]
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO texts (hash, text) VALUES (?, ?)",
+                    [(digest, text) for _, text, digest in rows]
+                )
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (namespace, id, hash) VALUES (?, ?, ?)",
+                    [(namespace, chunk_id, digest) for chunk_id, _, digest in rows]
+                )
+
+    def get_many(self, namespace, ids):
+        """Return a dict of id -> text for the IDs stored for a namespace"""
+        ids = list(dict.fromkeys(ids))
+        found = {}
+        with self.lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT c.id, t.text FROM chunks c JOIN texts t ON t.hash = c.hash "
+                    f"WHERE c.namespace = ? AND c.id IN ({placeholders})",
+                    [namespace] + batch
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def delete_namespace(self, namespace):
+        """Forget the chunks of a namespace, dropping texts no other chunk refers to"""
+        with self.lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM chunks WHERE namespace = ?", (namespace,))
+                self.conn.execute("DELETE FROM texts WHERE hash NOT IN (SELECT hash FROM chunks)")
+
+    def stats(self):
+        """Return chunk and unique text counts"""
+        with self.lock:
+            chunks = self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            texts = self.conn.execute("SELECT COUNT(*) FROM texts").fetchone()[0]
+        return {"chunks": chunks, "unique_texts": texts}
@@ -0,0 +1,207 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from keyword_index import tokenize
+
+# Local directory for on-disk retrieval data (indexes, caches)
+DATA_DIR = os.getenv("PARALEGAL_DATA_DIR", "index_data")
+DEFAULT_SUMMARY_STORE_PATH = os.path.join(DATA_DIR, "document_summaries.sqlite")
+
+# Filename words that say nothing about which document is meant
+NAME_STOPWORDS = {"pdf", "the", "of", "and", "in", "vs", "v", "versus", "ltd", "limited", "pvt", "case", "judgment"}
+
+# Filename words that separate the parties of a case
+PARTY_SEPARATORS = {"vs", "v", "versus"}
+
+PAGE_RANGE_PATTERN = re.compile(r"pages?\s+(\d+)\s*(?:-|to|through)\s*(\d+)")
+
+
+def name_terms(name):
+    """Distinctive lowercase words of a document or namespace name (citation codes with digits are dropped)"""
+    return {term for term in tokenize(name) if term not in NAME_STOPWORDS and not any(c.isdigit() for c in term)}
+
+
+def party_terms(name):
+    """
+    Distinctive words of each party named in a case file name.
+
+    "DN_Singh_vs_Commissioner_of_Income_Tax_Central_PatSC2023...pdf" gives
+    {dn, singh} and {commissioner, income, tax, central}; a word with digits
+    (the citation code) ends the last party.
+    """
+    parties = [set()]
+    for term in tokenize(name):
+        if term in PARTY_SEPARATORS or any(c.isdigit() for c in term):
+            parties.append(set())
+        elif term not in NAME_STOPWORDS:
+            parties[-1].add(term)
+    return [party for party in parties if party]
+
+
+def names_document(query_terms, source, namespace=None):
+    """
+    Whether a query's terms name a document distinctively.
+
+    That takes every word of one of its parties (for parties of two or more
+    words), or more than half of the distinctive words of its file name or,
+    when given, of its namespace name. Sharing a couple of topic words such
+    as "income tax" with a file name is not enough.
+    """
+    if any(len(party) >= 2 and party <= query_terms for party in party_terms(source)):
+        return True
+    return any(len(terms & query_terms) * 2 > len(terms)
+               for terms in (name_terms(source), name_terms(namespace or "")) if terms)
+
+
+def summarize_document(pages, generate, pages_per_section=10, workers=4):
+    """
+    Build a hierarchical summary of a document.
+
+    Consecutive page ranges are summarized concurrently, then the range
+    summaries are combined into one whole-document summary.
+
+    Args:
+        pages: List of {"page": number, "text": str} dicts, as from extract_text_from_pdf
+        generate: Callable taking a prompt and returning the generated text
+        pages_per_section: Pages per range summary
+        workers: Concurrent range summaries
+
+    Returns:
+        tuple: (list of (start_page, end_page, summary), document summary)
+    """
+    pages = [page for page in pages if page.get("text", "").strip()]
+    sections = [pages[i:i + pages_per_section] for i in range(0, len(pages), pages_per_section)]
+
+    def summarize_section(section):
+        text = "\n\n".join(page["text"] for page in section)
+        prompt = f"""Summarize pages {section[0]['page']}-{section[-1]['page']} of a legal document:
+
+{text}
+
+Keep the parties, facts, legal issues, holdings, dates and citations. Be concise and do not add information that is not in the text."""
+        return section[0]["page"], section[-1]["page"], generate(prompt)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        range_summaries = list(executor.map(summarize_section, sections))
+
+    failed = [summary for _, _, summary in range_summaries if summary.startswith("Error")]
+    if failed:
+        raise RuntimeError(failed[0])
+
+    if len(range_summaries) == 1:
+        return range_summaries, range_summaries[0][2]
+
+    combined_text = "\n\n".join(f"Pages {start}-{end}:\n{summary}" for start, end, summary in range_summaries)
+    document_summary = generate(f"""The following are summaries of consecutive page ranges of one legal document:
+
+{combined_text}
+
+Combine them into one comprehensive, well-structured summary of the whole document that covers the main legal points. Remove repetition and do not add information that is not in the summaries.""")
+    if document_summary.startswith("Error"):
+        raise RuntimeError(document_summary)
+    return range_summaries, document_summary
+
+
+class DocumentSummaryStore:
+    """
+    SQLite store of summaries precomputed at ingest time.
+
+    Each document (namespace and source file) has one whole-document summary
+    and one summary per page range, so document-level summary requests can
+    be answered by lookup instead of retrieval and generation.
+    """
+
+    def __init__(self, path=DEFAULT_SUMMARY_STORE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS document_summaries ("
+                "namespace TEXT, source TEXT, start_page INTEGER, end_page INTEGER, "
+                "summary TEXT, created REAL, PRIMARY KEY (namespace, source, start_page, end_page))"
+            )
+
+    def put(self, namespace, source, range_summaries, document_summary):
+        """Replace the stored summaries of a document; the whole document is stored as page range 0-0"""
+        rows = [(namespace, source, start, end, summary, time.time()) for start, end, summary in range_summaries]
+        rows.append((namespace, source, 0, 0, document_summary, time.time()))
+        with self.lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM document_summaries WHERE namespace = ? AND source = ?", (namespace, source))
+                self.conn.executemany("INSERT INTO document_summaries VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def documents(self):
+        """Return (namespace, source) for every summarized document"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT namespace, source FROM document_summaries WHERE start_page = 0"
+            ).fetchall()
+
+    def get(self, namespace, source, start_page=None, end_page=None):
+        """
+        Return a document's summary, or None.
+
+        With a page range, the range summaries overlapping it are joined instead.
+        """
+        with self.lock:
+            if start_page is None:
+                row = self.conn.execute(
+                    "SELECT summary FROM document_summaries WHERE namespace = ? AND source = ? AND start_page = 0",
+                    (namespace, source)
+                ).fetchone()
+                return row[0] if row else None
+
+            rows = self.conn.execute(
+                "SELECT start_page, end_page, summary FROM document_summaries "
+                "WHERE namespace = ? AND source = ? AND start_page > 0 AND start_page <= ? AND end_page >= ? "
+                "ORDER BY start_page",
+                (namespace, source, end_page, start_page)
+            ).fetchall()
+        if not rows:
+            return None
+        return "\n\n".join(f"Pages {start}-{end}:\n{summary}" for start, end, summary in rows)
+
+    def find(self, query):
+        """
+        Find the document a summary request names, returning (namespace, source, summary) or None.
+
+        A document matches only when the query names it (see names_document);
+        its namespace name counts when the namespace holds only that
+        document. Topical questions therefore still go to retrieval. A request for "pages 10-20" returns the matching page-range
+        summaries instead of the whole-document summary.
+        """
+        query_terms = set(tokenize(query))
+        best = None
+        best_overlap = 0
+        tied = False
+        documents = self.documents()
+        per_namespace = Counter(namespace for namespace, _ in documents)
+        for namespace, source in documents:
+            own_namespace = namespace if per_namespace[namespace] == 1 else None
+            if not names_document(query_terms, source, own_namespace):
+                continue
+            overlap = len((name_terms(source) | name_terms(own_namespace or "")) & query_terms)
+            if overlap > best_overlap:
+                best, best_overlap, tied = (namespace, source), overlap, False
+            elif overlap == best_overlap:
+                tied = True
+        if best is None or tied:
+            return None
+
+        page_range = PAGE_RANGE_PATTERN.search(query.lower())
+        if page_range:
+            start_page, end_page = sorted(int(page) for page in page_range.groups())
+            summary = self.get(*best, start_page=start_page, end_page=end_page)
+        else:
+            summary = self.get(*best)
+        return (best[0], best[1], summary) if summary else None
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+
+# Local directory for on-disk retrieval data (indexes, caches)
+DATA_DIR = os.getenv("PARALEGAL_DATA_DIR", "index_data")
+DEFAULT_CACHE_PATH = os.path.join(DATA_DIR, "embedding_cache.sqlite")
+
+
+def normalize_query(text):
+    """Normalize query text so trivially different spellings share a cache entry"""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for query embeddings.
+
+    An in-process LRU bounded by max_entries sits in front of a SQLite table
+    that survives restarts. Entries are keyed on the normalized query text and
+    the embedding model name, so switching models never returns stale vectors.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Hit/miss counters
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT, vector BLOB)"
+            )
+
+    def make_key(self, text, model):
+        """Build the cache key for a query and embedding model"""
+        return hashlib.sha256(f"{model}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, embedding):
+        """Insert into the in-memory tier, evicting the least recently used entry"""
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, text, model):
+        """Return the cached embedding for a query, or None"""
+        key = self.make_key(text, model)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return self.memory[key]
+
+            row = self.conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            embedding = array("f", row[0]).tolist()
+            self._remember(key, embedding)
+            self.disk_hits += 1
+            return embedding
+
+    def put(self, text, model, embedding):
+        """Store an embedding in both tiers"""
+        key = self.make_key(text, model)
+        with self.lock:
+            self._remember(key, list(embedding))
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)",
+                    (key, model, array("f", embedding).tobytes())
+                )
+
+    def stats(self):
+        """Return hit/miss counters and the in-memory size"""
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory)
+            }
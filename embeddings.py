@@ -4,7 +4,6 @@ import pytesseract
 from PIL import Image
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-import pinecone
 from langchain.docstore.document import Document
 from tqdm import tqdm
 from dotenv import load_dotenv
@@ -13,6 +12,15 @@ import glob
 import pandas as pd
 import tempfile
 import shutil
+import sys
+from keyword_index import KeywordIndex, tokenize
+from vector_store import get_vector_store, VECTOR_DIMENSION
+from http_client import get_gemini_client
+from document_summaries import DocumentSummaryStore, summarize_document
+from namespace_router import NamespaceRouter
+from sparse_vectors import encode_document
+from docstore import ChunkDocstore
+from snapshots import write_snapshot, read_snapshot, snapshot_info
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,6 +29,18 @@ load_dotenv()
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 INDEX_NAME = "ipd"
+GEMINI_MODEL = "gemini-1.5-flash"
+
+# Optionally store every document in one shared namespace, scoped by "collection" metadata
+SHARED_NAMESPACE = os.getenv("SHARED_NAMESPACE") or None
+
+# Hybrid retrieval needs BM25 sparse vectors upserted alongside the dense ones
+# (on Pinecone this requires an index using the dotproduct metric)
+SPARSE_VECTORS = os.getenv("RETRIEVAL_MODE", "separate").lower() == "hybrid"
+
+# Optionally precompute page-range and whole-document summaries at ingest
+INGEST_SUMMARIES = os.getenv("INGEST_SUMMARIES", "false").lower() in ("1", "true", "yes")
+PAGES_PER_SUMMARY = int(os.getenv("PAGES_PER_SUMMARY", "10"))
 
 # Set static directory path for all PDF files to embed
 EMBEDDING_DIRECTORY = r"D:\ipd\judmenents"
@@ -31,12 +51,24 @@ os.makedirs(EMBEDDING_DIRECTORY, exist_ok=True)
 # Set Tesseract OCR path
 pytesseract.pytesseract.tesseract_cmd = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
 
-# === STEP 1: Initialize Pinecone ===
-pc = pinecone.Pinecone(api_key=PINECONE_API_KEY, environment='us-east1')
+# === STEP 1: Initialize vector store (Pinecone unless VECTOR_STORE=local) ===
+vector_store = get_vector_store()
 
 # === STEP 2: Initialize Google Embeddings ===
 embedder = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", api_key=GOOGLE_API_KEY)
 
+# === STEP 2b: Initialize local keyword index ===
+keyword_index = KeywordIndex()
+
+# === STEP 2c: Initialize precomputed document summary store ===
+summary_store = DocumentSummaryStore()
+
+# === STEP 2d: Initialize namespace routing centroids ===
+namespace_router = NamespaceRouter()
+
+# === STEP 2e: Initialize local chunk text store (vector metadata carries no text) ===
+docstore = ChunkDocstore()
+
 # === STEP 3: Extract text from PDF ===
 def extract_text_from_pdf(pdf_path):
     text_chunks = []
@@ -109,7 +141,6 @@ def chunk_text(text_data, source_name):
                     "chunk_id": i,
                     "ocr": entry.get("ocr", False),
                     "chunk_length": len(chunk),
-                    "text": chunk,
                     "content_type": "pdf"
                 }
             )
@@ -122,18 +153,24 @@ def chunk_text(text_data, source_name):
 
 # === STEP 5: Embed and upload to Pinecone ===
 def upload_to_pinecone(docs, namespace):
-    index = pc.Index(INDEX_NAME)
-
     if not docs:
         print("No documents to upload!")
         return
 
+    # In shared-namespace mode the requested namespace becomes the chunks' collection
+    collection = namespace
+    if SHARED_NAMESPACE:
+        namespace = SHARED_NAMESPACE
+
     print(f"Uploading {len(docs)} chunks to '{namespace}'")
     batch_size = 50
 
     for i in range(0, len(docs), batch_size):
         batch = docs[i:i+batch_size]
         ids = [f"{doc.metadata['source']}-pdf-{doc.metadata.get('page', 0)}-c{doc.metadata['chunk_id']}" for doc in batch]
+        if SHARED_NAMESPACE:
+            # The same file may be uploaded to several collections
+            ids = [f"{collection}:{vector_id}" for vector_id in ids]
         texts = [doc.page_content for doc in batch]
 
         try:
@@ -145,8 +182,8 @@ def upload_to_pinecone(docs, namespace):
                 # Create metadata
                 meta = {
                     "source": doc.metadata["source"],
+                    "collection": collection,
                     "chunk_id": doc.metadata["chunk_id"],
-                    "text": doc.page_content,
                     "content_type": "pdf",
                     "page": doc.metadata.get("page", 0),
                     "ocr": doc.metadata.get("ocr", False)
@@ -154,16 +191,20 @@ def upload_to_pinecone(docs, namespace):
                 
                 metadatas.append(meta)
 
-            for j, meta in enumerate(metadatas):
-                if not meta.get('text') or not meta['text'].strip():
-                    print(f"Warning: Missing text content for chunk {meta.get('chunk_id', 'unknown')}")
-                    meta['text'] = texts[j]
+            sparse_values = [None] * len(ids)
+            if SPARSE_VECTORS:
+                avg_length = keyword_index.average_length(collection) or sum(len(tokenize(t)) for t in texts) / len(texts)
+                sparse_values = [encode_document(t, avg_length) for t in texts]
 
             vector_data = []
             for j in range(len(ids)):
-                vector_data.append((ids[j], embeddings[j], metadatas[j]))
+                vector_data.append((ids[j], embeddings[j], metadatas[j], sparse_values[j]))
 
-            index.upsert(vectors=vector_data, namespace=namespace)
+            # Texts go in first so a query never finds a vector whose text is missing
+            docstore.put(namespace, zip(ids, texts))
+            vector_store.upsert(vectors=vector_data, namespace=namespace)
+            keyword_index.add_documents(collection, [(ids[j], texts[j], metadatas[j]['source']) for j in range(len(ids))])
+            namespace_router.add_vectors(collection, embeddings)
             print(f"Batch {i//batch_size + 1}/{(len(docs)-1)//batch_size + 1} uploaded")
             time.sleep(0.5)
 
@@ -178,23 +219,187 @@ def upload_to_pinecone(docs, namespace):
                     # Create metadata for single document
                     single_metadata = {
                         "source": doc.metadata["source"],
+                        "collection": collection,
                         "chunk_id": doc.metadata["chunk_id"],
-                        "text": single_text,
                         "content_type": "pdf",
                         "page": doc.metadata.get("page", 0),
                         "ocr": doc.metadata.get("ocr", False)
                     }
                     
-                    index.upsert(vectors=[(single_id, single_embedding, single_metadata)], namespace=namespace)
+                    single_sparse = None
+                    if SPARSE_VECTORS:
+                        avg_length = keyword_index.average_length(collection) or len(tokenize(single_text))
+                        single_sparse = encode_document(single_text, avg_length)
+                    
+                    docstore.put(namespace, [(single_id, single_text)])
+                    vector_store.upsert(vectors=[(single_id, single_embedding, single_metadata, single_sparse)], namespace=namespace)
+                    keyword_index.add_documents(collection, [(single_id, single_text, single_metadata['source'])])
+                    namespace_router.add_vectors(collection, [single_embedding])
                     print(f"  Uploaded individual doc {j}")
                     time.sleep(0.5)
                 except Exception as inner_e:
                     print(f"  Failed on individual doc {j}: {str(inner_e)[:100]}")
 
+    vector_store.flush()
     print(f"Completed upload to '{namespace}'")
 
+# === STEP 5b: Migrate per-file namespaces into the shared namespace ===
+def migrate_to_shared_namespace(target=SHARED_NAMESPACE, delete_source=False, batch_size=100):
+    """
+    Copy every per-file namespace into one shared namespace.
+
+    Each vector keeps its values and metadata, gains a "collection" field
+    naming its old namespace and is re-keyed as "<collection>:<id>". The
+    collection's keyword index and chunk texts are re-keyed to match, and
+    text still held in old metadata moves to the docstore. In hybrid mode the
+    sparse values are rebuilt from the chunk text. Re-running is safe
+    because upserts overwrite. On Pinecone this needs a serverless index,
+    which supports listing vector IDs.
+    """
+    if not target:
+        raise ValueError("Set SHARED_NAMESPACE or pass the target namespace")
+
+    namespaces = [ns for ns in vector_store.list_namespaces() if ns != target]
+    print(f"Migrating {len(namespaces)} namespaces into '{target}'")
+
+    for namespace in namespaces:
+        # The collection's keyword index is rebuilt batch by batch under the new IDs
+        keyword_index.delete_namespace(namespace)
+        moved = 0
+        for matches, cursor in vector_store.export(namespace, batch_size=batch_size):
+            vectors = []
+            records = []
+            texts = docstore.get_many(namespace, [match.id for match in matches])
+            batch_texts = [(match.metadata or {}).get("text") or texts.get(match.id) or "" for match in matches]
+            avg_length = None
+            if SPARSE_VECTORS:
+                # Exported vectors carry no sparse values, so they are rebuilt from the text as on upload
+                avg_length = keyword_index.average_length(namespace) or sum(len(tokenize(t)) for t in batch_texts) / len(batch_texts) or 1
+            for match, text in zip(matches, batch_texts):
+                metadata = dict(match.metadata or {}, collection=namespace)
+                metadata.pop("text", None)
+                shared_id = f"{namespace}:{match.id}"
+                sparse_values = encode_document(text, avg_length) if SPARSE_VECTORS else None
+                vectors.append((shared_id, match.values, metadata, sparse_values))
+                if text:
+                    records.append((shared_id, text, metadata.get("source", "Unknown")))
+            docstore.put(target, [(shared_id, text) for shared_id, text, _ in records])
+            vector_store.upsert(vectors=vectors, namespace=target)
+            keyword_index.add_documents(namespace, records)
+            moved += len(vectors)
+            print(f"  '{namespace}': {moved} vectors copied (cursor {cursor})")
+
+        if delete_source:
+            vector_store.delete(namespace=namespace, delete_all=True)
+            docstore.delete_namespace(namespace)
+        print(f"  '{namespace}': {moved} vectors migrated")
+
+    vector_store.flush()
+    print(f"Completed migration into '{target}'")
+
+# === STEP 5c: Export and import namespace snapshots ===
+def export_namespace_snapshot(namespace, path, batch_size=100):
+    """
+    Write a namespace's IDs, vectors, metadata and chunk texts to a snapshot file.
+    
+    The file is Parquet, or Arrow IPC for .arrow/.feather paths (see
+    snapshots.write_snapshot), and can seed another environment with
+    import_namespace_snapshot without re-running OCR and embedding.
+    """
+    store_namespace, filter = (SHARED_NAMESPACE, {"collection": {"$eq": namespace}}) if SHARED_NAMESPACE else (namespace, None)
+    # Shared IDs start with the collection name, so only the collection's IDs are listed
+    prefix = f"{namespace}:" if SHARED_NAMESPACE else None
+    
+    def batches():
+        exported = 0
+        for matches, cursor in vector_store.export(store_namespace, batch_size=batch_size, filter=filter, prefix=prefix):
+            texts = docstore.get_many(store_namespace, [match.id for match in matches])
+            records = []
+            for match in matches:
+                metadata = dict(match.metadata or {})
+                text = metadata.pop("text", None) or texts.get(match.id)
+                metadata.pop("collection", None)
+                # Snapshots hold per-namespace IDs whatever the storage mode
+                vector_id = match.id[len(namespace) + 1:] if SHARED_NAMESPACE and match.id.startswith(f"{namespace}:") else match.id
+                records.append((vector_id, match.values, metadata, text))
+            exported += len(records)
+            print(f"  '{namespace}': {exported} vectors exported (cursor {cursor})")
+            yield records
+    
+    rows = write_snapshot(path, batches(), VECTOR_DIMENSION, info={"namespace": namespace, "embedding_model": embedder.model})
+    print(f"Exported {rows} vectors of '{namespace}' to {path}")
+    return rows
+
+def import_namespace_snapshot(path, namespace=None, batch_size=100):
+    """
+    Load a snapshot into the configured vector store (VECTOR_STORE=local for
+    an in-process, memory-mapped copy) under its original or a new namespace.
+    
+    Chunk texts, the keyword index and routing centroids are filled in as for
+    an upload, and sparse vectors are rebuilt from the texts in hybrid mode.
+    """
+    info = snapshot_info(path)
+    if info.get("dimension") != VECTOR_DIMENSION:
+        raise ValueError(f"Snapshot has {info.get('dimension')}-dimensional vectors, expected {VECTOR_DIMENSION}")
+    
+    collection = namespace or info["namespace"]
+    namespace = SHARED_NAMESPACE or collection
+    print(f"Importing {path} into '{collection}'")
+    
+    imported = 0
+    for ids, values, metadatas, texts in read_snapshot(path, batch_size=batch_size):
+        if SHARED_NAMESPACE:
+            ids = [f"{collection}:{vector_id}" for vector_id in ids]
+        metadatas = [dict(metadata, collection=collection) for metadata in metadatas]
+        
+        sparse_values = [None] * len(ids)
+        if SPARSE_VECTORS:
+            avg_length = keyword_index.average_length(collection) or sum(len(tokenize(t or "")) for t in texts) / len(texts) or 1
+            sparse_values = [encode_document(t, avg_length) for t in texts]
+        
+        docstore.put(namespace, zip(ids, texts))
+        vector_store.upsert(vectors=[(ids[j], values[j].tolist(), metadatas[j], sparse_values[j]) for j in range(len(ids))],
+                            namespace=namespace)
+        keyword_index.add_documents(collection, [(ids[j], texts[j], metadatas[j].get('source', "Unknown")) for j in range(len(ids)) if texts[j]])
+        namespace_router.add_vectors(collection, values)
+        imported += len(ids)
+        print(f"  '{collection}': {imported} vectors imported")
+    
+    vector_store.flush()
+    print(f"Completed import of {imported} vectors into '{collection}'")
+    return imported
+
+# === STEP 6: Precompute document summaries ===
+def generate_text(prompt, max_tokens=2000):
+    """Generate text with Gemini, returning an "Error..." string on failure"""
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={GOOGLE_API_KEY}"
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {"temperature": 0.0, "maxOutputTokens": max_tokens}
+    }
+    try:
+        response = get_gemini_client().post(url, headers={"Content-Type": "application/json"}, json=payload)
+        if response.status_code != 200:
+            return f"Error from Gemini API: {response.text[:200]}"
+        return response.json()['candidates'][0]['content']['parts'][0]['text']
+    except Exception as e:
+        return f"Error from Gemini API: {str(e)}"
+
+def store_document_summary(extracted, source_name, namespace):
+    """Summarize an extracted document by page range and as a whole, and store the summaries"""
+    print(f"Summarizing {source_name} ({PAGES_PER_SUMMARY} pages per section)...")
+    try:
+        range_summaries, document_summary = summarize_document(extracted, generate_text, pages_per_section=PAGES_PER_SUMMARY)
+        summary_store.put(namespace, source_name, range_summaries, document_summary)
+        namespace_router.set_summary_embedding(namespace, embedder.embed_query(document_summary))
+        print(f"Stored {len(range_summaries)} page-range summaries and a document summary for {source_name}")
+        return True
+    except Exception as e:
+        print(f"Summarization failed for {source_name}: {str(e)[:200]}")
+        return False
+
 # === RUN PDF PROCESSING ===
-def process_pdf(pdf_path):
+def process_pdf(pdf_path, summarize=INGEST_SUMMARIES):
     filename = os.path.basename(pdf_path)
     print(f"\nProcessing PDF: {filename}")
     extracted = extract_text_from_pdf(pdf_path)
@@ -202,6 +407,8 @@ def process_pdf(pdf_path):
     chunks = chunk_text(extracted, filename)
     print(f"Created {len(chunks)} chunks")
     upload_to_pinecone(chunks, namespace=filename)
+    if summarize:
+        store_document_summary(extracted, filename, namespace=filename)
     print(f"Completed processing PDF {filename}")
 
 # === PROCESS ALL PDFs IN DIRECTORY ===
@@ -220,13 +427,14 @@ def process_all_pdfs():
     print("Completed processing all PDF files")
 
 # === PROCESS UPLOADED PDF FILE ===
-def process_uploaded_file(uploaded_file, custom_namespace=None):
+def process_uploaded_file(uploaded_file, custom_namespace=None, summarize=INGEST_SUMMARIES):
     """
     Process a PDF file uploaded through a Streamlit interface
     
     Args:
         uploaded_file: The file object from st.file_uploader
         custom_namespace: Optional custom namespace name for Pinecone
+        summarize: Whether to precompute page-range and document summaries
         
     Returns:
         dict: Status information about the processing
@@ -247,6 +455,7 @@ def process_uploaded_file(uploaded_file, custom_namespace=None):
         chunks = chunk_text(extracted, filename)
         print(f"Created {len(chunks)} chunks")
         upload_to_pinecone(chunks, namespace=namespace)
+        summarized = store_document_summary(extracted, filename, namespace) if summarize else False
         print(f"Completed processing uploaded PDF {filename}")
         
         # Cleanup temporary file
@@ -257,7 +466,8 @@ def process_uploaded_file(uploaded_file, custom_namespace=None):
             "filename": filename,
             "namespace": namespace,
             "pages": len(extracted),
-            "chunks": len(chunks)
+            "chunks": len(chunks),
+            "summarized": summarized
         }
     except Exception as e:
         # Ensure temp file is cleaned up even if there's an error
@@ -275,13 +485,14 @@ def process_uploaded_file(uploaded_file, custom_namespace=None):
         }
 
 # === PROCESS MULTIPLE UPLOADED FILES ===
-def process_multiple_files(uploaded_files, namespace_prefix=None):
+def process_multiple_files(uploaded_files, namespace_prefix=None, summarize=INGEST_SUMMARIES):
     """
     Process multiple PDF files uploaded through a Streamlit interface
     
     Args:
         uploaded_files: List of file objects from st.file_uploader
         namespace_prefix: Optional prefix for namespace names
+        summarize: Whether to precompute page-range and document summaries
         
     Returns:
         list: List of status dictionaries for each processed file
@@ -296,7 +507,7 @@ def process_multiple_files(uploaded_files, namespace_prefix=None):
             custom_namespace = None
             
         # Process the individual file
-        result = process_uploaded_file(uploaded_file, custom_namespace)
+        result = process_uploaded_file(uploaded_file, custom_namespace, summarize)
         results.append(result)
         
         # Add a small delay between files to prevent rate limiting
@@ -307,6 +518,19 @@ def process_multiple_files(uploaded_files, namespace_prefix=None):
 
 # === MAIN EXECUTION ===
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate-shared":
+        # python embeddings.py migrate-shared [--delete-source]
+        migrate_to_shared_namespace(delete_source="--delete-source" in sys.argv)
+        sys.exit(0)
+    if len(sys.argv) > 3 and sys.argv[1] == "export-snapshot":
+        # python embeddings.py export-snapshot <namespace> <file.parquet|file.arrow>
+        export_namespace_snapshot(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+    if len(sys.argv) > 2 and sys.argv[1] == "import-snapshot":
+        # python embeddings.py import-snapshot <file> [namespace]
+        import_namespace_snapshot(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+        sys.exit(0)
+
     print("PDF Embedding Generator")
     print("=====================")
     print(f"Using directory: {EMBEDDING_DIRECTORY}")
@@ -0,0 +1,217 @@
+import math
+import heapq
+import random
+import numpy as np
+
+
+class HNSWIndex:
+    """
+    Hierarchical Navigable Small World graph for approximate cosine search.
+
+    Nodes are integer row numbers; vectors are stored normalized so
+    similarity is a dot product. M bounds the links per node (2*M on the
+    bottom layer), ef_construction controls build quality and ef_search is
+    the recall/latency knob at query time: larger values visit more of the
+    graph, finding more true neighbours at the cost of latency.
+    """
+
+    def __init__(self, dimension, M=16, ef_construction=100, ef_search=64, seed=42):
+        self.dimension = dimension
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.level_mult = 1 / math.log(M)
+        self.random = random.Random(seed)
+
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.count = 0
+        self.levels = []
+        self.links = []  # links[node][level] -> list of neighbour nodes
+        self.deleted = set()
+        self.entry_point = None
+        self.max_level = -1
+
+    def __len__(self):
+        return self.count - len(self.deleted)
+
+    def _normalize(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _reserve(self, size):
+        """Grow the vector buffer geometrically so inserts stay amortized O(1)"""
+        if size > len(self.vectors):
+            capacity = max(size, 2 * len(self.vectors), 1024)
+            grown = np.zeros((capacity, self.dimension), dtype=np.float32)
+            grown[:self.count] = self.vectors[:self.count]
+            self.vectors = grown
+
+    def _search_layer(self, query, entry_points, ef, level):
+        """Best-first search of one layer, returning up to ef (similarity, node) pairs"""
+        visited = set(entry_points)
+        similarities = self.vectors[entry_points] @ query
+        candidates = [(-s, n) for s, n in zip(similarities.tolist(), entry_points)]
+        heapq.heapify(candidates)
+        results = [(s, n) for s, n in zip(similarities.tolist(), entry_points)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            negative_similarity, node = heapq.heappop(candidates)
+            if -negative_similarity < results[0][0] and len(results) >= ef:
+                break
+
+            neighbours = [n for n in self.links[node][level] if n not in visited]
+            if not neighbours:
+                continue
+            visited.update(neighbours)
+
+            for similarity, neighbour in zip((self.vectors[neighbours] @ query).tolist(), neighbours):
+                if len(results) < ef or similarity > results[0][0]:
+                    heapq.heappush(candidates, (-similarity, neighbour))
+                    heapq.heappush(results, (similarity, neighbour))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        return results
+
+    def _shrink(self, node, level):
+        """Keep only the most similar links of a node that exceeded its degree bound"""
+        max_links = self.M * 2 if level == 0 else self.M
+        neighbours = self.links[node][level]
+        if len(neighbours) <= max_links:
+            return
+        similarities = self.vectors[neighbours] @ self.vectors[node]
+        keep = np.argsort(-similarities)[:max_links]
+        self.links[node][level] = [neighbours[i] for i in keep]
+
+    def add(self, vector):
+        """Insert a vector and return its node number"""
+        node = self.count
+        self._reserve(node + 1)
+        query = self._normalize(vector)
+        self.vectors[node] = query
+        self.count += 1
+
+        level = int(-math.log(1 - self.random.random()) * self.level_mult)
+        self.levels.append(level)
+        self.links.append([[] for _ in range(level + 1)])
+
+        if self.entry_point is None:
+            self.entry_point = node
+            self.max_level = level
+            return node
+
+        # Greedy descent through the layers above the new node's level
+        entry_points = [self.entry_point]
+        for current in range(self.max_level, level, -1):
+            nearest = max(self._search_layer(query, entry_points, 1, current))
+            entry_points = [nearest[1]]
+
+        # Link the node on every layer it lives on
+        for current in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(query, entry_points, self.ef_construction, current)
+            found.sort(reverse=True)
+            neighbours = [n for _, n in found[:self.M]]
+            self.links[node][current] = neighbours
+            for neighbour in neighbours:
+                self.links[neighbour][current].append(node)
+                self._shrink(neighbour, current)
+            entry_points = [n for _, n in found]
+
+        if level > self.max_level:
+            self.entry_point = node
+            self.max_level = level
+        return node
+
+    def add_items(self, vectors):
+        """Insert many vectors, returning their node numbers"""
+        return [self.add(vector) for vector in vectors]
+
+    def update(self, node, vector):
+        """Replace the vector of an existing node, keeping its links"""
+        self.vectors[node] = self._normalize(vector)
+
+    def mark_deleted(self, node):
+        """Exclude a node from search results; it still routes searches"""
+        self.deleted.add(node)
+
+    def search(self, vector, k=10, ef_search=None, allowed=None):
+        """
+        Return up to k (node, similarity) pairs, most similar first.
+
+        Args:
+            vector: Query vector
+            k: Number of neighbours to return
+            ef_search: Overrides the index default for this query
+            allowed: Optional boolean mask of nodes that may be returned
+        """
+        if self.entry_point is None:
+            return []
+
+        query = self._normalize(vector)
+        ef = max(ef_search or self.ef_search, k)
+
+        entry_points = [self.entry_point]
+        for current in range(self.max_level, 0, -1):
+            nearest = max(self._search_layer(query, entry_points, 1, current))
+            entry_points = [nearest[1]]
+
+        found = self._search_layer(query, entry_points, ef, 0)
+        found.sort(reverse=True)
+        results = []
+        for similarity, node in found:
+            if node in self.deleted or (allowed is not None and not allowed[node]):
+                continue
+            results.append((node, similarity))
+            if len(results) == k:
+                break
+        return results
+
+    def save(self, path):
+        """Write the graph and vectors to a .npz file"""
+        flat_links = []
+        offsets = [0]
+        for node in range(self.count):
+            for level_links in self.links[node]:
+                flat_links.extend(level_links)
+                offsets.append(len(flat_links))
+
+        np.savez(
+            path,
+            vectors=self.vectors[:self.count],
+            levels=np.asarray(self.levels, dtype=np.int32),
+            links=np.asarray(flat_links, dtype=np.int32),
+            offsets=np.asarray(offsets, dtype=np.int64),
+            deleted=np.asarray(sorted(self.deleted), dtype=np.int32),
+            params=np.asarray([self.M, self.ef_construction, self.ef_search,
+                               -1 if self.entry_point is None else self.entry_point, self.max_level], dtype=np.int64)
+        )
+
+    @classmethod
+    def load(cls, path, ef_search=None):
+        """Read an index written by save()"""
+        data = np.load(path)
+        M, ef_construction, saved_ef_search, entry_point, max_level = data["params"].tolist()
+        vectors = data["vectors"]
+        index = cls(vectors.shape[1], M=M, ef_construction=ef_construction,
+                    ef_search=ef_search or saved_ef_search)
+        index.vectors = np.array(vectors, dtype=np.float32)
+        index.count = len(vectors)
+        index.levels = data["levels"].tolist()
+        index.deleted = set(data["deleted"].tolist())
+        index.entry_point = None if entry_point < 0 else entry_point
+        index.max_level = max_level
+
+        links = data["links"].tolist()
+        offsets = data["offsets"].tolist()
+        position = 0
+        for level in index.levels:
+            node_links = []
+            for _ in range(level + 1):
+                node_links.append(links[offsets[position]:offsets[position + 1]])
+                position += 1
+            index.links.append(node_links)
+        return index
@@ -0,0 +1,216 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from deadline import NO_DEADLINE
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def backoff_delay(attempt, base=0.5, maximum=20.0, retry_after=None):
+    """Seconds to wait before retry number attempt: Retry-After if given, else full-jitter exponential backoff"""
+    if retry_after:
+        try:
+            return min(float(retry_after), maximum)
+        except ValueError:
+            pass
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+class RetryingHTTPClient:
+    """
+    Shared keep-alive HTTP session with timeouts, retries and a concurrency cap.
+
+    Connections are pooled so repeated calls skip the TCP and TLS handshake.
+    Failed attempts (429, 5xx, connection errors and timeouts) are retried
+    with exponential backoff and full jitter, honouring Retry-After. At most
+    max_concurrency requests are in flight at once; a streamed request holds
+    its slot until the response headers arrive.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=5.0, read_timeout=60.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=20.0, max_concurrency=4):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Seconds to wait before the next attempt"""
+        return backoff_delay(attempt, self.backoff_base, self.backoff_max, retry_after)
+
+    def post(self, url, timeout=None, deadline=None, **kwargs):
+        """
+        POST with retries and return the final requests.Response.
+
+        Args:
+            url: Request URL
+            timeout: Optional (connect, read) tuple or total seconds overriding the defaults
+            deadline: Optional deadline.Deadline; attempt timeouts are shortened to end
+                by it and no retry is started after it would have to wait past it
+            **kwargs: Passed through to requests (json, headers, stream, ...)
+
+        Raises:
+            requests.exceptions.RequestException: When every attempt failed to connect or
+                timed out, or the deadline passed
+        """
+        timeout = timeout or (self.connect_timeout, self.read_timeout)
+        deadline = deadline or NO_DEADLINE
+        attempt = 0
+        while True:
+            if deadline.expired():
+                raise requests.exceptions.Timeout("Request deadline exceeded")
+            attempt_timeout = tuple(map(deadline.cap, timeout)) if isinstance(timeout, tuple) else deadline.cap(timeout)
+            try:
+                if not self.semaphore.acquire(timeout=deadline.remaining()):
+                    raise requests.exceptions.Timeout("Request deadline exceeded waiting for a connection slot")
+                try:
+                    response = self.session.post(url, timeout=attempt_timeout, **kwargs)
+                finally:
+                    self.semaphore.release()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                delay = self.backoff_delay(attempt)
+                if attempt >= self.max_retries or deadline.cap(delay) < delay:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                delay = self.backoff_delay(attempt, response.headers.get("Retry-After"))
+                if deadline.cap(delay) < delay:
+                    return response
+                response.close()
+
+            print(f"Retrying request in {delay:.1f}s (attempt {attempt + 2}/{self.max_retries + 1})")
+            time.sleep(delay)
+            attempt += 1
+
+
+class AsyncRetryingHTTPClient:
+    """
+    asyncio counterpart of RetryingHTTPClient built on httpx.AsyncClient.
+
+    Same timeouts, retry policy and concurrency cap, but waiting on the
+    network or a backoff never blocks the event loop. The underlying client
+    is bound to the event loop that first uses it and is recreated when
+    called from a different loop (e.g. successive asyncio.run calls).
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=5.0, read_timeout=60.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=20.0, max_concurrency=4):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self.client = None
+        self.semaphore = None
+        self.loop = None
+
+    def _ensure_client(self):
+        loop = asyncio.get_running_loop()
+        if self.client is None or self.loop is not loop:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            )
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.loop = loop
+        return self.client
+
+    async def post(self, url, timeout=None, deadline=None, **kwargs):
+        """
+        POST with retries and return the final httpx.Response.
+
+        With a deadline.Deadline, each attempt (including the wait for a
+        concurrency slot) is cut off at the deadline and no retry is started
+        after it would have to wait past it.
+
+        Raises:
+            httpx.TransportError: When every attempt failed to connect or timed out, or the deadline passed
+        """
+        client = self._ensure_client()
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        deadline = deadline or NO_DEADLINE
+
+        async def attempt_post():
+            async with self.semaphore:
+                return await client.post(url, **kwargs)
+
+        attempt = 0
+        while True:
+            if deadline.expired():
+                raise httpx.TimeoutException("Request deadline exceeded")
+            try:
+                response = await asyncio.wait_for(attempt_post(), deadline.remaining())
+            except asyncio.TimeoutError:
+                raise httpx.TimeoutException("Request deadline exceeded")
+            except httpx.TransportError:
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                if attempt >= self.max_retries or deadline.cap(delay) < delay:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max,
+                                      response.headers.get("Retry-After"))
+                if deadline.cap(delay) < delay:
+                    return response
+
+            print(f"Retrying request in {delay:.1f}s (attempt {attempt + 2}/{self.max_retries + 1})")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+_gemini_client = None
+_async_gemini_client = None
+_gemini_client_lock = threading.Lock()
+
+
+def gemini_client_settings():
+    """Client settings for Gemini traffic, read from the environment"""
+    return {
+        "pool_size": int(os.getenv("GEMINI_POOL_SIZE", "10")),
+        "connect_timeout": float(os.getenv("GEMINI_CONNECT_TIMEOUT", "5")),
+        "read_timeout": float(os.getenv("GEMINI_READ_TIMEOUT", "60")),
+        "max_retries": int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+        "max_concurrency": int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+    }
+
+
+def get_gemini_client():
+    """Return the process-wide client used for Gemini traffic"""
+    global _gemini_client
+    with _gemini_client_lock:
+        if _gemini_client is None:
+            _gemini_client = RetryingHTTPClient(**gemini_client_settings())
+        return _gemini_client
+
+
+def get_async_gemini_client():
+    """Return the process-wide asyncio client used for Gemini traffic"""
+    global _async_gemini_client
+    with _gemini_client_lock:
+        if _async_gemini_client is None:
+            _async_gemini_client = AsyncRetryingHTTPClient(**gemini_client_settings())
+        return _async_gemini_client
@@ -0,0 +1,257 @@
+import os
+import re
+import math
+import heapq
+import sqlite3
+import threading
+from collections import Counter
+
+# Local directory for on-disk retrieval data (indexes, caches)
+DATA_DIR = os.getenv("PARALEGAL_DATA_DIR", "index_data")
+DEFAULT_INDEX_PATH = os.path.join(DATA_DIR, "keyword_index.sqlite")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercase text and split it into alphanumeric terms"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class KeywordIndex:
+    """
+    On-disk BM25 inverted index over chunk text.
+
+    Postings, chunk lengths and corpus statistics are kept per namespace in a
+    SQLite database, so a keyword query only reads the postings of its own
+    terms instead of scanning every chunk in the namespace.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS chunks (
+                namespace TEXT NOT NULL,
+                id TEXT NOT NULL,
+                source TEXT,
+                text TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                PRIMARY KEY (namespace, id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS postings (
+                namespace TEXT NOT NULL,
+                term TEXT NOT NULL,
+                id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (namespace, term, id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS namespace_stats (
+                namespace TEXT PRIMARY KEY,
+                doc_count INTEGER NOT NULL,
+                total_length INTEGER NOT NULL
+            );
+        """)
+        conn.commit()
+
+    def _connection(self):
+        """Return a SQLite connection owned by the current thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def has_namespace(self, namespace):
+        """Check whether any chunks have been indexed for a namespace"""
+        row = self._connection().execute(
+            "SELECT doc_count FROM namespace_stats WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return bool(row and row[0] > 0)
+
+    def namespaces(self):
+        """Return a dict of indexed namespaces and their chunk counts"""
+        rows = self._connection().execute(
+            "SELECT namespace, doc_count FROM namespace_stats WHERE doc_count > 0"
+        ).fetchall()
+        return dict(rows)
+
+    def namespace_versions(self):
+        """
+        Return a dict of namespace -> (chunk count, total length in terms).
+
+        Read straight from the database on every call, so it changes as soon
+        as any process indexes an upload.
+        """
+        rows = self._connection().execute(
+            "SELECT namespace, doc_count, total_length FROM namespace_stats WHERE doc_count > 0"
+        ).fetchall()
+        return {namespace: (doc_count, total_length) for namespace, doc_count, total_length in rows}
+
+    def average_length(self, namespace):
+        """Average chunk length in terms for a namespace, or None if it has no chunks"""
+        row = self._connection().execute(
+            "SELECT doc_count, total_length FROM namespace_stats WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row[1] / row[0] if row and row[0] else None
+
+    def term_idf(self, query_terms, namespace=None):
+        """
+        BM25 inverse document frequencies of the query terms.
+
+        Statistics come from one namespace, or from every namespace when
+        namespace is None. Terms that occur nowhere are left out.
+        """
+        terms = set()
+        for term in query_terms:
+            terms.update(tokenize(term))
+        if not terms:
+            return {}
+
+        conn = self._connection()
+        placeholders = ",".join("?" * len(terms))
+        if namespace is None:
+            doc_count = conn.execute("SELECT COALESCE(SUM(doc_count), 0) FROM namespace_stats").fetchone()[0]
+            rows = conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term",
+                list(terms)
+            ).fetchall()
+        else:
+            row = conn.execute(
+                "SELECT doc_count FROM namespace_stats WHERE namespace = ?", (namespace,)
+            ).fetchone()
+            doc_count = row[0] if row else 0
+            rows = conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE namespace = ? AND term IN ({placeholders}) GROUP BY term",
+                [namespace] + list(terms)
+            ).fetchall()
+        return {term: math.log(1 + (doc_count - df + 0.5) / (df + 0.5)) for term, df in rows}
+
+    def add_documents(self, namespace, records):
+        """
+        Index chunks for a namespace, replacing any chunk with the same ID.
+
+        Args:
+            namespace: Namespace the chunks were uploaded to
+            records: Iterable of (id, text, source) tuples
+        """
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                row = conn.execute(
+                    "SELECT doc_count, total_length FROM namespace_stats WHERE namespace = ?",
+                    (namespace,)
+                ).fetchone()
+                doc_count, total_length = row if row else (0, 0)
+
+                for doc_id, text, source in records:
+                    old = conn.execute(
+                        "SELECT length FROM chunks WHERE namespace = ? AND id = ?",
+                        (namespace, doc_id)
+                    ).fetchone()
+                    if old:
+                        conn.execute("DELETE FROM postings WHERE namespace = ? AND id = ?", (namespace, doc_id))
+                        doc_count -= 1
+                        total_length -= old[0]
+
+                    terms = tokenize(text or "")
+                    conn.execute(
+                        "INSERT OR REPLACE INTO chunks (namespace, id, source, text, length) VALUES (?, ?, ?, ?, ?)",
+                        (namespace, doc_id, source, text or "", len(terms))
+                    )
+                    conn.executemany(
+                        "INSERT INTO postings (namespace, term, id, tf) VALUES (?, ?, ?, ?)",
+                        [(namespace, term, doc_id, tf) for term, tf in Counter(terms).items()]
+                    )
+                    doc_count += 1
+                    total_length += len(terms)
+
+                conn.execute(
+                    "INSERT OR REPLACE INTO namespace_stats (namespace, doc_count, total_length) VALUES (?, ?, ?)",
+                    (namespace, doc_count, total_length)
+                )
+
+    def delete_namespace(self, namespace):
+        """Remove every chunk and posting of a namespace"""
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM postings WHERE namespace = ?", (namespace,))
+                conn.execute("DELETE FROM chunks WHERE namespace = ?", (namespace,))
+                conn.execute("DELETE FROM namespace_stats WHERE namespace = ?", (namespace,))
+
+    def search(self, query_terms, namespace, top_k=10):
+        """
+        Score the chunks of a namespace against the query terms with BM25.
+
+        Scores are divided by the best score a chunk could reach for the whole
+        query, counting terms the namespace lacks at their (high) IDF, so they
+        fall in [0, 1), a namespace matching only a few common terms scores
+        low, and scores stay comparable with the cosine scores of vector search.
+
+        Returns:
+            list: Dicts with id, score, text and source, best first
+        """
+        terms = set()
+        for term in query_terms:
+            terms.update(tokenize(term))
+        if not terms:
+            return []
+
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT doc_count, total_length FROM namespace_stats WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        if not row or row[0] == 0:
+            return []
+        doc_count, total_length = row
+        avg_length = total_length / doc_count or 1.0
+
+        scores = Counter()
+        max_score = 0.0
+        for term in terms:
+            postings = conn.execute(
+                "SELECT p.id, p.tf, c.length FROM postings p "
+                "JOIN chunks c ON c.namespace = p.namespace AND c.id = p.id "
+                "WHERE p.namespace = ? AND p.term = ?",
+                (namespace, term)
+            ).fetchall()
+
+            df = len(postings)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            max_score += idf * (self.k1 + 1)
+            for doc_id, tf, length in postings:
+                norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if not scores:
+            return []
+
+        top = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        placeholders = ",".join("?" * len(top))
+        rows = conn.execute(
+            f"SELECT id, text, source FROM chunks WHERE namespace = ? AND id IN ({placeholders})",
+            [namespace] + [doc_id for doc_id, _ in top]
+        ).fetchall()
+        chunks = {doc_id: (text, source) for doc_id, text, source in rows}
+
+        results = []
+        for doc_id, score in top:
+            text, source = chunks[doc_id]
+            results.append({
+                "id": doc_id,
+                "score": score / max_score,
+                "text": text,
+                "source": source or "Unknown"
+            })
+        return results
@@ -0,0 +1,168 @@
+import json
+import time
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class LatencyMetrics:
+    """
+    Per-stage latency histograms for the RAG pipeline.
+
+    Stages are timed with span() or the timed() decorator and can be exported
+    as a JSON document or in the Prometheus text exposition format. Discrete
+    events (e.g. which retrieval path a question took) are counted with
+    increment().
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        """Record one duration for a stage"""
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = {
+                    "counts": [0] * len(self.buckets),
+                    "count": 0,
+                    "sum": 0.0,
+                    "max": 0.0
+                }
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["counts"][i] += 1
+                    break
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            histogram["max"] = max(histogram["max"], seconds)
+
+    def increment(self, event, value="", amount=1):
+        """Count one occurrence of an event, optionally split by value"""
+        with self.lock:
+            values = self.counters.setdefault(event, {})
+            values[value] = values.get(value, 0) + amount
+
+    @contextmanager
+    def span(self, stage):
+        """Time the enclosed block as one observation of a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage):
+        """Decorator that times every call of a function as a stage"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """Return a copy of every stage's histogram with cumulative bucket counts"""
+        with self.lock:
+            result = {}
+            for stage, histogram in self.stages.items():
+                cumulative = []
+                running = 0
+                for count in histogram["counts"]:
+                    running += count
+                    cumulative.append(running)
+                result[stage] = {
+                    "count": histogram["count"],
+                    "sum": histogram["sum"],
+                    "mean": histogram["sum"] / histogram["count"] if histogram["count"] else 0.0,
+                    "max": histogram["max"],
+                    "buckets": {str(bound): c for bound, c in zip(self.buckets, cumulative)}
+                }
+            return result
+
+    def counter_snapshot(self):
+        """Return a copy of every event counter"""
+        with self.lock:
+            return {event: dict(values) for event, values in self.counters.items()}
+
+    def reset(self):
+        """Forget all observations"""
+        with self.lock:
+            self.stages = {}
+            self.counters = {}
+
+    def to_json(self):
+        """Export all stage histograms and event counters as JSON"""
+        return json.dumps({"stages": self.snapshot(), "counters": self.counter_snapshot()}, indent=2)
+
+    def to_prometheus(self):
+        """Export all stage histograms and event counters in the Prometheus text format"""
+        name = "rag_stage_latency_seconds"
+        lines = [
+            f"# HELP {name} Latency of RAG pipeline stages in seconds",
+            f"# TYPE {name} histogram"
+        ]
+        for stage, histogram in sorted(self.snapshot().items()):
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram["sum"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram["count"]}')
+
+        name = "rag_events_total"
+        lines.append(f"# HELP {name} Count of RAG pipeline events")
+        lines.append(f"# TYPE {name} counter")
+        for event, values in sorted(self.counter_snapshot().items()):
+            for value, count in sorted(values.items()):
+                lines.append(f'{name}{{event="{event}",value="{value}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry used by the RAG pipeline
+METRICS = LatencyMetrics()
+
+_server = None
+
+
+def start_metrics_server(port, registry=METRICS):
+    """
+    Serve /metrics (Prometheus text) and /metrics.json from a background thread.
+
+    Only one server is started per process; later calls return the same one.
+    """
+    global _server
+    if _server is not None:
+        return _server
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = registry.to_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body = registry.to_json().encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    _server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    print(f"Metrics available at http://localhost:{port}/metrics")
+    return _server
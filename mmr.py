@@ -0,0 +1,47 @@
+import numpy as np
+
+
+def mmr_select(relevance, embeddings, k, lambda_mult=0.7):
+    """
+    Pick k items by maximal marginal relevance.
+
+    Each step takes the item maximising
+    lambda_mult * relevance - (1 - lambda_mult) * (highest cosine similarity
+    to an item already picked), so near-duplicates of earlier picks sink.
+    Pairwise similarities come from one matrix product and every step is a
+    vectorized update, so no Python loop runs over candidate pairs.
+
+    Args:
+        relevance: Relevance score per item
+        embeddings: Matrix with one embedding row per item (zero rows count as unlike everything)
+        k: Number of items to pick
+        lambda_mult: 1.0 ranks by relevance only, 0.0 by novelty only
+
+    Returns:
+        list: Indices of the picked items in selection order
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    k = min(k, len(relevance))
+    if k <= 0:
+        return []
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1)
+    similarity = vectors @ vectors.T
+
+    first = int(np.argmax(relevance))
+    selected = [first]
+    available = np.ones(len(relevance), dtype=bool)
+    available[first] = False
+    max_similarity = similarity[first].copy()
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+
+    return selected
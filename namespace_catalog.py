@@ -0,0 +1,57 @@
+import time
+import threading
+
+
+class NamespaceCatalog:
+    """
+    Namespace names and vector counts served from memory.
+
+    Listing namespaces is a control-plane call (describe_index_stats on
+    Pinecone), so its result is cached for ttl seconds and otherwise only reloaded when refresh() is called, e.g.
+    right after new documents have been ingested. A loader callable can
+    replace store.list_namespaces as the source of the counts. After a
+    failed reload the last catalogue is served for retry_after seconds
+    before the store is asked again.
+    """
+
+    def __init__(self, store, ttl=300, loader=None, retry_after=30):
+        self.store = store
+        self.loader = loader or store.list_namespaces
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.last_counts = {}
+        self._loaded_at = None
+        self.lock = threading.Lock()
+
+    def is_stale(self):
+        """Check whether the cached catalogue has expired or was never loaded"""
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def refresh(self):
+        """Reload namespace vector counts from the vector store and return them"""
+        with self.lock:
+            self.last_counts = self.loader()
+            self._loaded_at = time.monotonic()
+            return dict(self.last_counts)
+
+    def invalidate(self):
+        """Force the next read to reload from the vector store"""
+        with self.lock:
+            self._loaded_at = None
+
+    def counts(self):
+        """Return a dict of namespace names and their vector counts"""
+        if self.is_stale():
+            try:
+                return self.refresh()
+            except Exception as e:
+                # Keep serving the last known catalogue if the store is unreachable,
+                # and only try again once the retry window has passed
+                print("Error refreshing namespace catalogue: " + str(e))
+                with self.lock:
+                    self._loaded_at = time.monotonic() - self.ttl + min(self.retry_after, self.ttl)
+        return dict(self.last_counts)
+
+    def names(self):
+        """Return the list of namespace names"""
+        return list(self.counts().keys())
@@ -0,0 +1,130 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+
+# Local directory for on-disk retrieval data (indexes, caches)
+DATA_DIR = os.getenv("PARALEGAL_DATA_DIR", "index_data")
+DEFAULT_ROUTER_PATH = os.path.join(DATA_DIR, "namespace_routes.sqlite")
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class NamespaceRouter:
+    """
+    Per-namespace centroid embeddings for routing questions to documents.
+
+    Each namespace keeps the running sum of its normalized chunk embeddings
+    (whose direction is the centroid) and optionally the embedding of its
+    document summary. A question is routed to the namespaces whose centroid
+    or summary is most similar to the question embedding.
+    """
+
+    def __init__(self, path=DEFAULT_ROUTER_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self._cache = None
+        self._cache_version = None
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS namespace_routes ("
+                "namespace TEXT PRIMARY KEY, vector_count INTEGER, vector_sum BLOB, summary BLOB)"
+            )
+
+    def add_vectors(self, namespace, vectors):
+        """Fold newly uploaded chunk embeddings into a namespace's centroid"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        added = (vectors / np.where(norms > 0, norms, 1)).sum(axis=0)
+
+        with self.lock:
+            with self.conn:
+                row = self.conn.execute(
+                    "SELECT vector_count, vector_sum FROM namespace_routes WHERE namespace = ?", (namespace,)
+                ).fetchone()
+                if row is None:
+                    self.conn.execute(
+                        "INSERT INTO namespace_routes (namespace, vector_count, vector_sum) VALUES (?, ?, ?)",
+                        (namespace, len(vectors), added.tobytes())
+                    )
+                else:
+                    total = np.frombuffer(row[1], dtype=np.float32) + added
+                    self.conn.execute(
+                        "UPDATE namespace_routes SET vector_count = ?, vector_sum = ? WHERE namespace = ?",
+                        (row[0] + len(vectors), total.tobytes(), namespace)
+                    )
+            self._writes += 1
+
+    def set_summary_embedding(self, namespace, embedding):
+        """Attach the embedding of a namespace's document summary"""
+        with self.lock:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO namespace_routes (namespace, vector_count, summary) VALUES (?, 0, ?) "
+                    "ON CONFLICT(namespace) DO UPDATE SET summary = excluded.summary",
+                    (namespace, _unit(embedding).tobytes())
+                )
+            self._writes += 1
+
+    def delete_namespace(self, namespace):
+        """Forget the routing data of a namespace"""
+        with self.lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM namespace_routes WHERE namespace = ?", (namespace,))
+            self._writes += 1
+
+    def routed_namespaces(self):
+        """Return the set of namespaces that have a centroid"""
+        return set(self._load()[0])
+
+    def _load(self):
+        """Return (names, centroid matrix, summary matrix), re-reading SQLite only after writes"""
+        with self.lock:
+            # data_version changes when another connection (e.g. the ingest process) commits
+            version = (self.conn.execute("PRAGMA data_version").fetchone()[0], self._writes)
+            if self._cache is not None and self._cache_version == version:
+                return self._cache
+
+            rows = self.conn.execute(
+                "SELECT namespace, vector_sum, summary FROM namespace_routes WHERE vector_count > 0"
+            ).fetchall()
+            names = [row[0] for row in rows]
+            centroids = np.array([_unit(np.frombuffer(row[1], dtype=np.float32)) for row in rows], dtype=np.float32)
+            summaries = np.array([np.frombuffer(row[2], dtype=np.float32) if row[2] else np.zeros(len(centroids[i]), dtype=np.float32)
+                                  for i, row in enumerate(rows)], dtype=np.float32)
+            self._cache = (names, centroids, summaries)
+            self._cache_version = version
+            return self._cache
+
+    def route(self, query_embedding, namespaces, top_n):
+        """
+        Pick the namespaces most likely to answer a question.
+
+        Namespaces are scored by the larger of their centroid and summary
+        similarities to the query embedding; the top_n best are returned.
+        Namespaces without routing data cannot be judged and are always kept.
+        """
+        names, centroids, summaries = self._load()
+        candidates = set(namespaces)
+        routed = [i for i, name in enumerate(names) if name in candidates]
+        unrouted = [namespace for namespace in namespaces if namespace not in set(names)]
+        if not routed:
+            return list(namespaces)
+
+        query = _unit(query_embedding)
+        scores = np.maximum(centroids[routed] @ query, summaries[routed] @ query)
+        best = np.argsort(-scores)[:top_n]
+        return [names[routed[i]] for i in best] + unrouted
@@ -4,13 +4,32 @@ import re
 from collections import Counter
 import numpy as np
 from dotenv import load_dotenv
-import pinecone
 import requests
+import httpx
 import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 import glob
+from keyword_index import KeywordIndex, tokenize
+from embedding_cache import EmbeddingCache
+from answer_cache import SemanticAnswerCache
+from namespace_catalog import NamespaceCatalog
+from vector_store import get_vector_store
+from text_match import get_matcher
+from metrics import METRICS, start_metrics_server
+from http_client import get_gemini_client, get_async_gemini_client
+from context_packer import pack_contexts, estimate_tokens
+from summary_cache import SummaryCache
+from document_summaries import DocumentSummaryStore, names_document
+from namespace_router import NamespaceRouter
+from sparse_vectors import encode_query, hybrid_scale
+from docstore import ChunkDocstore
+from deadline import Deadline, NO_DEADLINE
+from mmr import mmr_select
 
 # Load environment variables
 load_dotenv()
@@ -18,18 +37,16 @@ load_dotenv()
 class RAGChatbot:
     def __init__(self):
         # Initialize API keys from environment
-        self.pinecone_api_key = os.getenv("PINECONE_API_KEY")
         self.google_api_key = os.getenv("GOOGLE_API_KEY")
         
-        # Initialize Pinecone
-        self.pc = pinecone.Pinecone(
-            api_key=self.pinecone_api_key,
-            environment='us-east1'
-        )
-        
         # Initialize Gemini API settings
         self.gemini_model = "gemini-1.5-flash"
         self.gemini_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.gemini_model}:generateContent"
+        self.gemini_stream_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.gemini_model}:streamGenerateContent"
+        
+        # Pooled keep-alive clients with timeouts and retries for Gemini calls
+        self.gemini_client = get_gemini_client()
+        self.async_gemini_client = get_async_gemini_client()
         
         # Initialize embedding model - using the same as in embeddings.py
         self.embedding_model = GoogleGenerativeAIEmbeddings(
@@ -37,13 +54,109 @@ class RAGChatbot:
             api_key=self.google_api_key
         )
         
-        # Initialize Pinecone index
-        self.index_name = "ipd"
-        self.index = self.pc.Index(self.index_name)
+        # Cache query embeddings in memory and on disk
+        self.embedding_cache = EmbeddingCache(max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "1024")))
+        
+        # Reuse answers for paraphrased questions over unchanged namespaces
+        self.answer_cache = SemanticAnswerCache(
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+            max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+        )
+        
+        # Initialize vector store (Pinecone index "ipd" unless VECTOR_STORE=local)
+        self.store = get_vector_store()
+        
+        # Initialize local BM25 keyword index (kept in sync by embeddings.py)
+        self.keyword_index = KeywordIndex()
+        # Namespaces whose keyword backfill has been tried, so a failed or empty one is not retried per query
+        self.keyword_backfills = set()
+        self.keyword_backfill_lock = threading.Lock()
+        
+        # Chunk texts keyed by vector ID; vector metadata no longer carries them
+        self.docstore = ChunkDocstore()
+        
+        # Shared-namespace mode: every chunk lives in one vector store namespace and
+        # its "collection" metadata names the document namespace it belongs to
+        self.shared_namespace = os.getenv("SHARED_NAMESPACE") or None
+        
+        # Namespace names and vector counts, cached in memory with a TTL (retried after
+        # NAMESPACE_RETRY_AFTER seconds when a reload fails); in shared-namespace mode
+        # the collections are listed from the keyword index
+        self.namespace_catalog = NamespaceCatalog(
+            self.store,
+            ttl=float(os.getenv("NAMESPACE_CACHE_TTL", "300")),
+            loader=self.keyword_index.namespaces if self.shared_namespace else None,
+            retry_after=float(os.getenv("NAMESPACE_RETRY_AFTER", "30"))
+        )
         
-        # Vector dimension for dummy vectors
+        # Vector dimension of the embedding model
         self.vector_dimension = 768  # Standard for embedding-004
         
+        # Reciprocal-rank fusion constant for multi-query vector search
+        self.rrf_k = 60
+        
+        # Maximal marginal relevance: with MMR_LAMBDA below 1.0 the best MMR_CANDIDATES x top_k fused
+        # results are reranked to trade relevance (1.0) against novelty (0.0) before the top_k cut,
+        # so overlapping neighbour chunks do not crowd out other material
+        self.mmr_lambda = float(os.getenv("MMR_LAMBDA", "1.0"))
+        self.mmr_candidates = int(os.getenv("MMR_CANDIDATES", "3"))
+        
+        # Estimated token budget for retrieved excerpts in a Gemini prompt
+        self.context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+        
+        # Summary settings: "standard" sends one prompt, "map_reduce" summarizes
+        # chunk groups concurrently and then combines the partial summaries. Map-reduce
+        # retrieves MAP_REDUCE_TOP_K chunks, and when most of them come from one document
+        # it summarizes every chunk of that document (up to SUMMARY_DOCUMENT_MAX_CHUNKS)
+        self.summary_method = os.getenv("SUMMARY_METHOD", "standard")
+        self.summary_top_k = int(os.getenv("SUMMARY_TOP_K", "10"))
+        self.map_reduce_top_k = int(os.getenv("MAP_REDUCE_TOP_K", "40"))
+        self.summary_document_max_chunks = int(os.getenv("SUMMARY_DOCUMENT_MAX_CHUNKS", "500"))
+        self.summary_group_tokens = int(os.getenv("SUMMARY_GROUP_TOKENS", "3000"))
+        self.summary_executor = ThreadPoolExecutor(max_workers=max(1, int(os.getenv("SUMMARY_WORKERS", "4"))))
+        self.summary_cache = SummaryCache()
+        
+        # Page-range and whole-document summaries precomputed at ingest (embeddings.py)
+        self.document_summaries = DocumentSummaryStore()
+        
+        # "hybrid" sends dense and BM25 sparse vectors in one query per namespace instead of
+        # running the local keyword search; HYBRID_ALPHA weighs dense (1.0) against sparse (0.0)
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "separate").lower()
+        self.hybrid_alpha = float(os.getenv("HYBRID_ALPHA", "0.5"))
+        
+        # Adaptive retrieval: vector search runs first; if its best score reaches EARLY_EXIT_SCORE the
+        # keyword stage only searches the namespaces it hit, and if every top-k score clears the
+        # threshold by EARLY_EXIT_MARGIN the keyword stage is skipped
+        self.adaptive_retrieval = os.getenv("ADAPTIVE_RETRIEVAL", "false").lower() in ("1", "true", "yes")
+        self.early_exit_score = float(os.getenv("EARLY_EXIT_SCORE", "0.75"))
+        self.early_exit_margin = float(os.getenv("EARLY_EXIT_MARGIN", "0.05"))
+        
+        # Per-request latency budget in seconds (0 disables it). Retrieval (cache lookup, keyword
+        # and vector stages) may use RETRIEVAL_SHARE of it, and the keyword stage and the vector
+        # stage (embedding plus namespace queries) each at most their stage timeout, the keyword
+        # stage half the retrieval share unless set; work still running at a deadline is abandoned
+        # and the answer is built from what arrived in time, flagged as partial. Generation gets
+        # the rest of the budget, but never less than MIN_GENERATION_TIME seconds
+        self.chat_deadline = float(os.getenv("CHAT_DEADLINE", "0"))
+        self.retrieval_share = float(os.getenv("RETRIEVAL_SHARE", "0.5"))
+        self.min_generation_time = float(os.getenv("MIN_GENERATION_TIME", "2"))
+        self.keyword_stage_timeout = (float(os.getenv("KEYWORD_STAGE_TIMEOUT", "0"))
+                                      or self.chat_deadline * self.retrieval_share / 2)
+        self.vector_stage_timeout = float(os.getenv("VECTOR_STAGE_TIMEOUT", "0"))
+        
+        # Centroid routing: search only the ROUTING_TOP_N most similar namespaces (0 searches all)
+        self.namespace_router = NamespaceRouter()
+        self.routing_top_n = int(os.getenv("ROUTING_TOP_N", "0"))
+        
+        # Thread pool for fanning out per-namespace searches
+        self.max_concurrency = int(os.getenv("RAG_MAX_CONCURRENCY", "8"))
+        self.executor = ThreadPoolExecutor(max_workers=max(1, self.max_concurrency))
+        
+        # Optionally expose stage latency metrics over HTTP
+        metrics_port = os.getenv("RAG_METRICS_PORT")
+        if metrics_port:
+            start_metrics_server(int(metrics_port))
+        
         # Initialize text splitter
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=2000,
@@ -105,12 +218,16 @@ class RAGChatbot:
         }
         return responses.get(category, "I'm here to help you analyze legal documents and answer your questions.")
 
-    def list_namespaces(self):
-        """List all available namespaces in the index"""
+    @METRICS.timed("list_namespaces")
+    def list_namespaces(self, refresh=False):
+        """List all available namespaces in the index, served from the namespace catalogue"""
+        # Reads within the TTL never touch the index
+        if not refresh and not self.namespace_catalog.is_stale():
+            return self.namespace_catalog.names()
+        
         print("\n=== AVAILABLE NAMESPACES ===")
         try:
-            stats = self.index.describe_index_stats()
-            namespaces = stats.namespaces
+            namespaces = self.namespace_catalog.refresh()
             if namespaces:
                 try:
                     print("Found " + str(len(namespaces)) + " namespaces:")
@@ -130,7 +247,85 @@ class RAGChatbot:
                 print("Error listing namespaces: " + str(e))
             except UnicodeEncodeError:
                 print("Error listing namespaces (display error)")
+            # Fall back to the last known catalogue
+            return list(self.namespace_catalog.last_counts.keys())
+
+    def refresh_namespaces(self):
+        """Reload the namespace catalogue, e.g. after new documents have been ingested"""
+        return self.list_namespaces(refresh=True)
+
+    def fan_out(self, func, items, deadline=None, timed_out=None):
+        """
+        Run func over items on the bounded thread pool, yielding (item, result) as each one finishes.
+        
+        With a limited deadline, items not finished when it passes are cancelled
+        (or abandoned, if already running) and appended to timed_out.
+        """
+        deadline = deadline or NO_DEADLINE
+        if (self.max_concurrency <= 1 or len(items) <= 1) and not deadline.limited:
+            for item in items:
+                yield item, func(item)
+            return
+        
+        futures = {self.executor.submit(func, item): item for item in items}
+        finished = set()
+        try:
+            for future in as_completed(futures, timeout=deadline.remaining()):
+                finished.add(future)
+                yield futures[future], future.result()
+        except FuturesTimeoutError:
+            for future, item in futures.items():
+                if future in finished:
+                    continue
+                if future.done():
+                    yield item, future.result()
+                else:
+                    future.cancel()
+                    if timed_out is not None:
+                        timed_out.append(item)
+
+    async def gather_until(self, coroutines, items, deadline=None, timed_out=None):
+        """
+        Async counterpart of fan_out: await one coroutine per item until the deadline.
+        
+        Returns (item, result) pairs for the coroutines that finished in time; the
+        rest are cancelled and their items appended to timed_out.
+        """
+        tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+        if not tasks:
             return []
+        done, pending = await asyncio.wait(tasks, timeout=(deadline or NO_DEADLINE).remaining())
+        for task, item in zip(tasks, items):
+            if task in pending:
+                task.cancel()
+                if timed_out is not None:
+                    timed_out.append(item)
+        return [(item, task.result()) for task, item in zip(tasks, items) if task in done]
+
+    def retrieval_deadline(self, deadline):
+        """Deadline for the retrieval part of a request, leaving the rest of the budget to generation"""
+        return deadline.stage(self.chat_deadline * self.retrieval_share)
+
+    def generation_deadline(self, deadline):
+        """Deadline for generating an answer: what is left of the budget, but at least MIN_GENERATION_TIME"""
+        return deadline.at_least(self.min_generation_time)
+
+    def record_timeouts(self, stage, items, stats):
+        """Log and count work abandoned at a deadline, flagging the retrieval as partial in stats"""
+        for item in items:
+            print(f"Deadline reached: {stage} stage gave up on {item}")
+            METRICS.increment("deadline_timeout", stage)
+        if items and stats is not None:
+            stats["partial"] = True
+            stats.setdefault("timed_out", []).extend(f"{stage}:{item}" for item in items)
+
+    async def run_blocking(self, func, *args):
+        """Run a blocking call (vector store, keyword index) on the bounded thread pool without blocking the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def get_namespace_counts(self):
+        """Return a dict of namespace names and their vector counts"""
+        return self.namespace_catalog.counts()
 
     def extract_keywords(self, text):
         """Extract important keywords from text for query expansion"""
@@ -150,6 +345,7 @@ class RAGChatbot:
         
         return all_keywords
 
+    @METRICS.timed("expand_query")
     def expand_query(self, question):
         """Generate multiple query variations to improve retrieval"""
         # For very long queries (more than 10 words), limit expansion
@@ -226,161 +422,481 @@ class RAGChatbot:
         
         return queries
 
-    def get_all_vectors(self, namespace, batch_size=3000):
-        """Retrieve all vectors from a namespace using pagination."""
-        all_matches = []
+    def store_location(self, namespace):
+        """Return the vector store namespace and metadata filter that hold a document namespace"""
+        if self.shared_namespace:
+            return self.shared_namespace, {"collection": {"$eq": namespace}}
+        return namespace, None
+
+    def vector_search_targets(self, namespaces):
+        """Return the (store namespace, filter) pairs to query to search the given document namespaces"""
+        if not self.shared_namespace:
+            return [(namespace, None) for namespace in namespaces]
         
-        # Use a dummy vector for query
-        dummy_vector = [0.0] * self.vector_dimension
+        # One query covers every collection; a metadata filter scopes it to a subset
+        if set(namespaces) >= set(self.list_namespaces()):
+            return [(self.shared_namespace, None)]
+        return [(self.shared_namespace, {"collection": {"$in": list(namespaces)}})]
+
+    def export_vectors(self, namespace, include_values=False, cursor=None, batch_size=100, filter=None):
+        """
+        Stream every vector of a document namespace as (matches, cursor) batches.
         
-        # Pagination with ID filtering
-        next_page_id = None
-        while True:
-            query_params = {
-                "vector": dummy_vector,
-                "namespace": namespace,
-                "top_k": batch_size,
-                "include_metadata": True
-            }
-            
-            # Add ID filter for pagination
-            if next_page_id:
-                query_params["id"] = {"not_in": [next_page_id]}
-            
-            result = self.index.query(**query_params)
-            
-            if not result.matches:
-                break
-                
-            all_matches.extend(result.matches)
+        Vectors are listed by ID and fetched page by page (see VectorStore.export),
+        so any namespace size is covered in bounded memory. Progress is printed
+        every 1000 vectors; a printed cursor resumes the export after that point.
+        A metadata filter narrows the export further. In shared-namespace mode
+        only IDs with the collection's "<namespace>:" prefix are listed.
+        """
+        store_namespace, collection_filter = self.store_location(namespace)
+        if collection_filter and filter:
+            filter = {"$and": [collection_filter, filter]}
+        else:
+            filter = collection_filter or filter
+        prefix = f"{namespace}:" if self.shared_namespace else None
+        
+        reported = [0]
+        
+        def progress(exported, next_cursor):
+            if exported // 1000 > reported[0]:
+                reported[0] = exported // 1000
+                print(f"  {namespace}: {exported} vectors exported (cursor {next_cursor})")
+        
+        return self.store.export(store_namespace, batch_size=batch_size, cursor=cursor,
+                                 include_values=include_values, filter=filter, progress=progress, prefix=prefix)
+
+    def index_namespace_keywords(self, namespace):
+        """Build the local keyword index for a namespace uploaded before indexing existed"""
+        print(f"Building keyword index for namespace {namespace}...")
+        indexed = 0
+        for matches, _ in self.export_vectors(namespace):
+            texts = self.docstore.get_many(self.store_location(namespace)[0], [match.id for match in matches])
+            records = []
+            for match in matches:
+                metadata = match.metadata or {}
+                text = metadata.get('text') or texts.get(match.id)
+                if text:
+                    records.append((match.id, text, metadata.get("source", "Unknown")))
+            self.keyword_index.add_documents(namespace, records)
+            indexed += len(records)
+        print(f"Indexed {indexed} chunks for namespace {namespace}")
+
+    def index_namespace_centroid(self, namespace):
+        """Build routing data for a namespace uploaded before routing existed"""
+        print(f"Building routing centroid for namespace {namespace}...")
+        for matches, _ in self.export_vectors(namespace, include_values=True):
+            self.namespace_router.add_vectors(namespace, [match.values for match in matches if match.values])
+
+    @METRICS.timed("route_namespaces")
+    def route_namespaces(self, question, namespaces):
+        """
+        Narrow the namespaces to search to the routing_top_n whose centroids are most similar to the question.
+        
+        All namespaces are searched when routing is off, when there are no
+        more namespaces than routing_top_n, or when routing fails.
+        """
+        if self.routing_top_n <= 0 or len(namespaces) <= self.routing_top_n:
+            return namespaces
+        
+        try:
+            # Namespaces uploaded before routing existed get their centroid once
+            routed_namespaces = self.namespace_router.routed_namespaces()
+            for namespace in namespaces:
+                if namespace not in routed_namespaces:
+                    self.index_namespace_centroid(namespace)
             
-            if len(result.matches) < batch_size:
-                break
-                
-            # Get the last ID for pagination
-            next_page_id = result.matches[-1].id
+            query_embedding = self.embed_queries([question])[0]
+            routed = self.namespace_router.route(query_embedding, namespaces, self.routing_top_n)
+        except Exception as e:
+            print(f"Namespace routing failed, searching all namespaces: {str(e)}")
+            return namespaces
         
-        return all_matches
+        print(f"Routing question to {len(routed)} of {len(namespaces)} namespaces")
+        return routed or namespaces
 
+    @METRICS.timed("keyword_search")
     def keyword_search_in_namespace(self, query_terms, namespace, top_k=10):
-        """Search for multiple keywords in a namespace"""
-        
-        # Get all vectors from the namespace
-        matches = self.get_all_vectors(namespace)
+        """Search for multiple keywords in a namespace using the local BM25 index"""
         found_results = []
-        
-        # For each match, check for keyword presence
-        for match in matches:
-            if not match.metadata or 'text' not in match.metadata:
-                continue
-                
-            text = match.metadata['text']
-            text_lower = text.lower()
+        try:
+            # Namespaces uploaded before the keyword index existed are indexed once per process
+            if not self.keyword_index.has_namespace(namespace):
+                with self.keyword_backfill_lock:
+                    backfill = namespace not in self.keyword_backfills
+                    self.keyword_backfills.add(namespace)
+                if backfill:
+                    self.index_namespace_keywords(namespace)
             
-            # Check how many query terms are in the text
-            matching_terms = [term for term in query_terms if term.lower() in text_lower]
+            matches = self.keyword_index.search(query_terms, namespace, top_k=top_k)
             
-            # Calculate score based on term presence
-            if matching_terms:
-                score = len(matching_terms) / len(query_terms)
-                
-                # Extract context around matches
-                contexts = []
-                for term in matching_terms:
-                    term_lower = term.lower()
-                    # Find all occurrences
-                    start_idx = 0
-                    while True:
-                        idx = text_lower.find(term_lower, start_idx)
-                        if idx == -1:
-                            break
-                        
-                        start_context = max(0, idx - 200)
-                        end_context = min(len(text), idx + len(term) + 200)
-                        context = text[start_context:end_context]
-                        contexts.append(context)
-                        
-                        # Move past this occurrence
-                        start_idx = idx + len(term)
+            # One automaton finds every term occurrence in a single pass per chunk
+            matcher = get_matcher(tuple(query_terms))
+            
+            # Build contexts for the top scoring chunks only
+            for match in matches:
+                text = match['text']
                 
-                # Deduplicate contexts
-                unique_contexts = []
-                for ctx in contexts:
-                    if ctx not in unique_contexts:
-                        unique_contexts.append(ctx)
+                # Matched terms plus merged ±200 character windows around them
+                found_terms, unique_contexts = matcher.extract(text, radius=200)
+                matching_terms = [term for term in query_terms if term.lower() in found_terms]
                 
                 # Add to results
                 found_results.append({
-                    "id": match.id,
+                    "id": match['id'],
                     "namespace": namespace,
-                    "score": score,
-                    "matching_terms": matching_terms,
+                    "score": match['score'],
+                    "matching_terms": matching_terms or ["keyword match"],
                     "text": text,
-                    "contexts": unique_contexts,
-                    "source": match.metadata.get("source", "Unknown")
+                    "contexts": unique_contexts or [text],
+                    "source": match['source']
                 })
+        except Exception as e:
+            print(f"Error in keyword search for namespace {namespace}: {str(e)}")
+            return []
         
-        # Sort by score
-        found_results.sort(key=lambda x: x['score'], reverse=True)
+        # Results come back from the index already sorted by BM25 score
+        return found_results
+
+    def sparse_query(self, query_terms, namespace):
+        """Sparse BM25 query vector, weighted with IDF statistics from the local keyword index when available"""
+        if self.shared_namespace:
+            idf = self.keyword_index.term_idf(query_terms) if self.keyword_index.namespaces() else None
+        else:
+            idf = self.keyword_index.term_idf(query_terms, namespace) if self.keyword_index.has_namespace(namespace) else None
+        return encode_query(query_terms, idf)
+
+    def vector_search_in_namespace(self, query_embedding, namespace, top_k=10, filter=None, query_terms=None):
+        """
+        Query a single vector store namespace with a query embedding, optionally filtered by metadata.
         
-        # Return top results
-        return found_results[:top_k]
+        With query_terms (hybrid mode) a sparse BM25 vector is sent in the same
+        request and scores blend both by hybrid_alpha.
+        
+        Results carry no text or contexts yet (see hydrate_results) unless the
+        chunk was uploaded before the docstore and still has text in metadata.
+        """
+        results = []
+        try:
+            sparse_vector = self.sparse_query(query_terms, namespace) if query_terms else None
+            if sparse_vector:
+                query_embedding, sparse_vector = hybrid_scale(query_embedding, sparse_vector, self.hybrid_alpha)
+            
+            # Query the vector store
+            with METRICS.span("vector_query"):
+                query_results = self.store.query(
+                    vector=query_embedding,
+                    namespace=namespace,
+                    top_k=top_k,
+                    include_metadata=True,
+                    filter=filter,
+                    sparse_vector=sparse_vector
+                )
+            
+            # Process results
+            for match in query_results.matches:
+                if match.score > 0:  # Only include non-zero scores
+                    metadata = match.metadata or {}
+                    results.append({
+                        "id": match.id,
+                        "namespace": metadata.get("collection", namespace) if self.shared_namespace else namespace,
+                        "score": match.score,
+                        "matching_terms": ["semantic match"],
+                        "text": metadata.get("text"),
+                        "contexts": [],
+                        "source": metadata.get("source", "Unknown"),
+                        "match_type": "hybrid" if sparse_vector else "vector"
+                    })
+        except Exception as e:
+            print(f"Error in vector search for namespace {namespace}: {str(e)}")
+        
+        return results
 
-    def vector_search(self, query, namespaces=None, top_k=10):
-        """Perform vector search using embedding model"""
-        # Generate embedding for the query
-        query_embedding = self.embedding_model.embed_query(query)
+    def embed_queries(self, queries):
+        """Embed one or more query strings, serving repeats from the cache and batching the rest into a single request"""
+        model = self.embedding_model.model
+        embeddings = [self.embedding_cache.get(query, model) for query in queries]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
         
-        all_results = []
+        if missing:
+            with METRICS.span("embedding"):
+                if len(missing) == 1:
+                    new_embeddings = [self.embedding_model.embed_query(queries[missing[0]])]
+                else:
+                    new_embeddings = self.embedding_model.embed_documents(
+                        [queries[i] for i in missing], task_type="RETRIEVAL_QUERY"
+                    )
+            for i, embedding in zip(missing, new_embeddings):
+                self.embedding_cache.put(queries[i], model, embedding)
+                embeddings[i] = embedding
+        
+        return embeddings
+
+    def embed_before(self, queries, deadline=None):
+        """embed_queries, or None if the embeddings do not arrive before a limited deadline"""
+        deadline = deadline or NO_DEADLINE
+        if not deadline.limited:
+            return self.embed_queries(queries)
+        
+        future = self.executor.submit(self.embed_queries, queries)
+        try:
+            return future.result(timeout=deadline.remaining())
+        except FuturesTimeoutError:
+            future.cancel()
+            return None
+
+    async def aembed_before(self, queries, deadline=None):
+        """Async variant of embed_before"""
+        try:
+            return await asyncio.wait_for(self.aembed_queries(queries), (deadline or NO_DEADLINE).remaining())
+        except asyncio.TimeoutError:
+            return None
+
+    async def aembed_queries(self, queries):
+        """Async variant of embed_queries"""
+        model = self.embedding_model.model
+        embeddings = [self.embedding_cache.get(query, model) for query in queries]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        if missing:
+            with METRICS.span("embedding"):
+                new_embeddings = await self.embedding_model.aembed_documents(
+                    [queries[i] for i in missing], task_type="RETRIEVAL_QUERY"
+                )
+            for i, embedding in zip(missing, new_embeddings):
+                self.embedding_cache.put(queries[i], model, embedding)
+                embeddings[i] = embedding
+        
+        return embeddings
+
+    @METRICS.timed("rank_fusion")
+    def reciprocal_rank_fusion(self, ranked_lists, top_k):
+        """Fuse several ranked result lists by reciprocal rank, keeping each chunk's best similarity score"""
+        fused = {}
+        for ranked in ranked_lists:
+            for rank, result in enumerate(ranked):
+                entry = fused.get(result['id'])
+                if entry is None:
+                    entry = fused[result['id']] = dict(result, rrf_score=0.0)
+                elif result['score'] > entry['score']:
+                    entry['score'] = result['score']
+                entry['rrf_score'] += 1.0 / (self.rrf_k + rank + 1)
+        
+        fused_results = sorted(fused.values(), key=lambda x: x['rrf_score'], reverse=True)
+        return fused_results[:top_k]
+
+    def vector_search(self, query, namespaces=None, top_k=10, queries=None, deadline=None, timed_out=None):
+        """
+        Perform vector search using embedding model.
+        
+        When query variants are given (e.g. from expand_query) they are embedded
+        in one batched request, each variant is searched, and the per-variant
+        rankings are merged with reciprocal-rank fusion.
+        
+        With a deadline, results are returned from the namespaces that answered
+        in time; the embedding request or namespaces that did not are added to
+        timed_out.
+        """
+        # Original query always goes first
+        queries = [query] + [q for q in (queries or []) if q != query]
+        timed_out = [] if timed_out is None else timed_out
+        
+        # Generate embeddings for all query variants
+        query_embeddings = self.embed_before(queries, deadline)
+        if query_embeddings is None:
+            timed_out.append("embedding")
+            return []
         
         # If namespaces not specified, search in all namespaces
         if not namespaces:
             namespaces = self.list_namespaces()
         
-        # Search each namespace
-        for namespace in namespaces:
-            try:
-                # Query Pinecone index
-                query_results = self.index.query(
-                    vector=query_embedding,
-                    namespace=namespace,
-                    top_k=top_k,
-                    include_metadata=True
-                )
-                
-                # Process results
-                for match in query_results.matches:
-                    if match.score > 0:  # Only include non-zero scores
-                        if match.metadata and 'text' in match.metadata:
-                            # Create context from text
-                            text = match.metadata['text']
-                            # Limit context to a manageable size
-                            if len(text) > 800:
-                                context = text[:800] + "..."
-                            else:
-                                context = text
-                                
-                            # Add to results
-                            all_results.append({
-                                "id": match.id,
-                                "namespace": namespace,
-                                "score": match.score,
-                                "matching_terms": ["semantic match"],  # No specific keywords for vector search
-                                "text": text,
-                                "contexts": [context],
-                                "source": match.metadata.get("source", "Unknown"),
-                                "match_type": "vector"
-                            })
-            except Exception as e:
-                print(f"Error in vector search for namespace {namespace}: {str(e)}")
-        
-        # Sort by score
+        # Search every (namespace, variant) pair concurrently and merge results as they arrive
+        ranked_lists = [[] for _ in queries]
+        query_terms = self.variant_terms(queries)
+        tasks = [(target, i) for target in self.vector_search_targets(namespaces) for i in range(len(queries))]
+        search = lambda task: self.vector_search_in_namespace(query_embeddings[task[1]], task[0][0], top_k=top_k,
+                                                              filter=task[0][1], query_terms=query_terms[task[1]])
+        slow_tasks = []
+        for (target, i), namespace_results in self.fan_out(search, tasks, deadline, slow_tasks):
+            ranked_lists[i].extend(namespace_results)
+        timed_out.extend(sorted({target[0] for target, i in slow_tasks}))
+        
+        return self.rank_vector_results(ranked_lists, top_k)
+
+    async def avector_search(self, query, namespaces=None, top_k=10, queries=None, deadline=None, timed_out=None):
+        """Async variant of vector_search; namespace queries run concurrently on the thread pool"""
+        queries = [query] + [q for q in (queries or []) if q != query]
+        timed_out = [] if timed_out is None else timed_out
+        query_embeddings = await self.aembed_before(queries, deadline)
+        if query_embeddings is None:
+            timed_out.append("embedding")
+            return []
+        
+        if not namespaces:
+            namespaces = await self.run_blocking(self.list_namespaces)
+        
+        query_terms = self.variant_terms(queries)
+        tasks = [(target, i) for target in self.vector_search_targets(namespaces) for i in range(len(queries))]
+        slow_tasks = []
+        results = await self.gather_until((
+            self.run_blocking(self.vector_search_in_namespace, query_embeddings[i], namespace, top_k, filter, query_terms[i])
+            for (namespace, filter), i in tasks
+        ), tasks, deadline, slow_tasks)
+        timed_out.extend(sorted({target[0] for target, i in slow_tasks}))
+        
+        ranked_lists = [[] for _ in queries]
+        for (target, i), namespace_results in results:
+            ranked_lists[i].extend(namespace_results)
+        
+        return self.rank_vector_results(ranked_lists, top_k)
+
+    def variant_terms(self, queries):
+        """Keyword terms of each query variant for hybrid queries, or None per variant for dense-only search"""
+        if self.retrieval_mode != "hybrid":
+            return [None] * len(queries)
+        return [[word for word in query.lower().split() if word not in self.stopwords] or None for query in queries]
+
+    def rank_vector_results(self, ranked_lists, top_k):
+        """Rank each query variant's results by score and fuse the variants"""
+        for ranked in ranked_lists:
+            ranked.sort(key=lambda x: x['score'], reverse=True)
+        
+        if len(ranked_lists) == 1:
+            return ranked_lists[0][:top_k]
+        
+        return self.reciprocal_rank_fusion(ranked_lists, top_k)
+
+    def candidate_embeddings(self, results):
+        """Stored embeddings of results as a matrix, fetched in one batch per vector store namespace (zero rows when missing)"""
+        by_namespace = {}
+        for i, result in enumerate(results):
+            by_namespace.setdefault(self.store_location(result['namespace'])[0], []).append(i)
+        
+        embeddings = np.zeros((len(results), self.vector_dimension), dtype=np.float32)
+        for store_namespace, indices in by_namespace.items():
+            fetched = self.store.fetch([results[i]['id'] for i in indices], store_namespace)
+            for i in indices:
+                match = fetched.get(results[i]['id'])
+                if match is not None and match.values:
+                    embeddings[i] = match.values
+        return embeddings
+
+    @METRICS.timed("mmr")
+    def diversify(self, results, top_k):
+        """
+        Cut fused results to top_k, picking them by maximal marginal relevance when MMR is on.
+        
+        Candidates are the best mmr_candidates * top_k results; relevance is
+        their fused score and redundancy the cosine similarity of their stored
+        embeddings. Falls back to the plain cut if embeddings cannot be fetched.
+        """
+        if self.mmr_lambda >= 1.0 or len(results) <= top_k:
+            return results[:top_k]
+        
+        candidates = results[:top_k * max(1, self.mmr_candidates)]
+        try:
+            embeddings = self.candidate_embeddings(candidates)
+        except Exception as e:
+            print(f"Skipping MMR, could not fetch candidate embeddings: {str(e)}")
+            return results[:top_k]
+        
+        order = mmr_select([result['score'] for result in candidates], embeddings, top_k, self.mmr_lambda)
+        return [candidates[i] for i in order]
+
+    @METRICS.timed("hydrate")
+    def hydrate_results(self, results, query_terms=None):
+        """
+        Fill in the text and contexts of vector results.
+        
+        Texts missing from metadata are fetched from the docstore in one batch
+        per vector store namespace, so only the final top-k are ever read.
+        Hybrid results get keyword snippets for query_terms like the keyword
+        search. Results whose text cannot be found are dropped.
+        """
+        missing = {}
+        for result in results:
+            if result.get('text') is None:
+                missing.setdefault(self.store_location(result['namespace'])[0], []).append(result['id'])
+        
+        texts = {}
+        for store_namespace, ids in missing.items():
+            for chunk_id, text in self.docstore.get_many(store_namespace, ids).items():
+                texts[(store_namespace, chunk_id)] = text
+        
+        matcher = get_matcher(tuple(query_terms)) if query_terms else None
+        hydrated = []
+        for result in results:
+            text = result.get('text')
+            if text is None:
+                text = texts.get((self.store_location(result['namespace'])[0], result['id']))
+                if text is None:
+                    print(f"Warning: No stored text for chunk {result['id']}")
+                    continue
+                result['text'] = text
+            
+            if not result.get('contexts'):
+                # Limit context to a manageable size
+                context = text[:800] + "..." if len(text) > 800 else text
+                contexts = []
+                if result.get('match_type') == "hybrid" and matcher is not None:
+                    found_terms, contexts = matcher.extract(text, radius=200)
+                    result['matching_terms'] = [term for term in query_terms if term.lower() in found_terms] or result['matching_terms']
+                result['contexts'] = contexts or [context]
+            hydrated.append(result)
+        
+        return hydrated
+
+    @METRICS.timed("fusion")
+    def fuse_results(self, all_results):
+        """Sort keyword and vector results together and drop duplicate chunks"""
+        # Sort all results by score
         all_results.sort(key=lambda x: x['score'], reverse=True)
         
-        return all_results[:top_k]
+        # Remove duplicates by ID
+        unique_results = []
+        seen_ids = set()
+        for result in all_results:
+            if result['id'] not in seen_ids:
+                unique_results.append(result)
+                seen_ids.add(result['id'])
+        
+        return unique_results
+
+    def plan_keyword_stage(self, vector_results, namespaces, top_k):
+        """
+        Decide how much keyword search adaptive retrieval still needs after vector search.
+        
+        Returns (path, namespaces to keyword search):
+        "vector_only" when all top_k vector scores clear early_exit_score by
+        early_exit_margin, "narrowed" (only the namespaces vector search hit)
+        when the best score reaches early_exit_score, else "full".
+        """
+        scores = [result['score'] for result in vector_results[:top_k]]
+        if len(scores) == top_k and min(scores) >= self.early_exit_score + self.early_exit_margin:
+            return "vector_only", []
+        if scores and max(scores) >= self.early_exit_score:
+            hit_namespaces = {result['namespace'] for result in vector_results[:top_k]}
+            return "narrowed", [namespace for namespace in namespaces if namespace in hit_namespaces]
+        return "full", namespaces
+
+    def record_retrieval_path(self, path, stats):
+        """Count the retrieval path a question took and report it through stats"""
+        METRICS.increment("retrieval_path", path)
+        if stats is not None:
+            stats["retrieval_path"] = path
+        print(f"Retrieval path: {path}")
 
-    def retrieve_context(self, question, top_k=10):
-        """Advanced multi-strategy retrieval"""
+    @METRICS.timed("retrieve_context")
+    def retrieve_context(self, question, top_k=10, stats=None, deadline=None):
+        """
+        Advanced multi-strategy retrieval.
+        
+        If a stats dict is given, the retrieval path taken is stored in it
+        ("full", "narrowed", "vector_only" or "hybrid"). With a deadline the
+        keyword and vector stages each stop at their stage deadline; stats then
+        gets partial=True and the timed-out work if anything was abandoned.
+        """
+        deadline = deadline or NO_DEADLINE
         # Fix encoding issues by handling the output safely
         try:
             print("\nProcessing question: " + question)
@@ -391,43 +907,123 @@ class RAGChatbot:
         expanded_queries = self.expand_query(question)
         
         # 2. Get all keywords for keyword search
-        all_keywords = []
-        for query in expanded_queries:
-            all_keywords.extend(query.split())
-        # Deduplicate
-        all_keywords = list(set(all_keywords))
+        all_keywords = self.query_keywords(expanded_queries)
         
-        # 3. Get all namespaces
+        # 3. Get all namespaces, narrowed to the most relevant ones when routing is on
         namespaces = self.list_namespaces()
         if not namespaces:
             print("No namespaces found to search.")
             return []
+        namespaces = self.route_namespaces(question, namespaces)
         
-        # 4. Search each namespace using keywords
+        # Hybrid mode scores keywords inside the vector queries themselves
+        hybrid = self.retrieval_mode == "hybrid"
+        adaptive = self.adaptive_retrieval and not hybrid
+        
+        # 4. Adaptive mode searches vectors first and narrows or skips the keyword stage on strong hits
+        path, keyword_namespaces = ("hybrid", []) if hybrid else ("full", namespaces)
+        vector_timeouts = []
+        if adaptive:
+            vector_results = self.vector_search(question, namespaces, top_k=top_k, queries=expanded_queries,
+                                                deadline=deadline.stage(self.vector_stage_timeout), timed_out=vector_timeouts)
+            path, keyword_namespaces = self.plan_keyword_stage(vector_results, namespaces, top_k)
+            if path != "vector_only":
+                vector_results = vector_results[:top_k//2]
+        self.record_retrieval_path(path, stats)
+        
+        # 5. Search each namespace using keywords, concurrently, until the keyword stage deadline
         all_results = []
-        for namespace in namespaces:
-            namespace_results = self.keyword_search_in_namespace(all_keywords, namespace, top_k=top_k)
+        keyword_timeouts = []
+        search = lambda namespace: self.keyword_search_in_namespace(all_keywords, namespace, top_k=top_k)
+        for namespace, namespace_results in self.fan_out(search, keyword_namespaces,
+                                                         deadline.stage(self.keyword_stage_timeout), keyword_timeouts):
             all_results.extend(namespace_results)
+        self.record_timeouts("keyword", keyword_timeouts, stats)
         
-        # 5. Also perform vector search for semantic matching
-        vector_results = self.vector_search(question, namespaces, top_k=top_k//2)
+        # 6. Also perform vector search for semantic matching
+        if not adaptive:
+            vector_results = self.vector_search(question, namespaces, top_k=top_k if hybrid else top_k//2, queries=expanded_queries,
+                                                deadline=deadline.stage(self.vector_stage_timeout), timed_out=vector_timeouts)
+        self.record_timeouts("vector", vector_timeouts, stats)
         all_results.extend(vector_results)
         
-        # 6. Sort all results by score
-        all_results.sort(key=lambda x: x['score'], reverse=True)
+        # 7. Sort all results by score and remove duplicates by ID
+        unique_results = self.fuse_results(all_results)
         
-        # 7. Remove duplicates by ID
-        unique_results = []
-        seen_ids = set()
-        for result in all_results:
-            if result['id'] not in seen_ids:
-                unique_results.append(result)
-                seen_ids.add(result['id'])
+        # 8. Take top_k results (diversified when MMR is on) and fetch their texts
+        top_results = self.hydrate_results(self.diversify(unique_results, top_k), all_keywords)
+        self.print_top_results(top_results)
         
-        # 8. Take top_k results
-        top_results = unique_results[:top_k]
+        return top_results
+
+    async def aretrieve_context(self, question, top_k=10, stats=None, deadline=None):
+        """
+        Async variant of retrieve_context.
         
-        # Print results summary safely
+        Keyword searches and the vector search are awaited together, so one
+        event loop can serve many questions while they wait on the index.
+        """
+        deadline = deadline or NO_DEADLINE
+        with METRICS.span("retrieve_context"):
+            try:
+                print("\nProcessing question: " + question)
+            except UnicodeEncodeError:
+                print("\nProcessing question: [contains special characters]")
+            
+            expanded_queries = await self.run_blocking(self.expand_query, question)
+            all_keywords = self.query_keywords(expanded_queries)
+            
+            namespaces = await self.run_blocking(self.list_namespaces)
+            if not namespaces:
+                print("No namespaces found to search.")
+                return []
+            namespaces = await self.run_blocking(self.route_namespaces, question, namespaces)
+            
+            hybrid = self.retrieval_mode == "hybrid"
+            adaptive = self.adaptive_retrieval and not hybrid
+            
+            path, keyword_namespaces = ("hybrid", []) if hybrid else ("full", namespaces)
+            vector_timeouts = []
+            if adaptive:
+                vector_results = await self.avector_search(question, namespaces, top_k=top_k, queries=expanded_queries,
+                                                           deadline=deadline.stage(self.vector_stage_timeout),
+                                                           timed_out=vector_timeouts)
+                path, keyword_namespaces = self.plan_keyword_stage(vector_results, namespaces, top_k)
+                if path != "vector_only":
+                    vector_results = vector_results[:top_k//2]
+            self.record_retrieval_path(path, stats)
+            
+            keyword_timeouts = []
+            keyword_searches = self.gather_until([
+                self.run_blocking(self.keyword_search_in_namespace, all_keywords, namespace, top_k)
+                for namespace in keyword_namespaces
+            ], keyword_namespaces, deadline.stage(self.keyword_stage_timeout), keyword_timeouts)
+            if adaptive:
+                keyword_results = await keyword_searches
+            else:
+                vector_search = self.avector_search(question, namespaces, top_k=top_k if hybrid else top_k//2, queries=expanded_queries,
+                                                    deadline=deadline.stage(self.vector_stage_timeout), timed_out=vector_timeouts)
+                keyword_results, vector_results = await asyncio.gather(keyword_searches, vector_search)
+            self.record_timeouts("keyword", keyword_timeouts, stats)
+            self.record_timeouts("vector", vector_timeouts, stats)
+            
+            all_results = [result for namespace, results in keyword_results for result in results]
+            all_results.extend(vector_results)
+            
+            top_results = await self.run_blocking(self.diversify, self.fuse_results(all_results), top_k)
+            top_results = await self.run_blocking(self.hydrate_results, top_results, all_keywords)
+            self.print_top_results(top_results)
+            return top_results
+
+    def query_keywords(self, expanded_queries):
+        """Deduplicated keywords from all query variants, without stopwords"""
+        all_keywords = []
+        for query in expanded_queries:
+            all_keywords.extend(word for word in query.split() if word.lower().strip("?.,!;:'\"") not in self.stopwords)
+        return list(set(all_keywords))
+
+    def print_top_results(self, top_results):
+        """Print a short summary of the retrieved documents"""
         try:
             print("\nFound " + str(len(top_results)) + " relevant documents:")
             for i, result in enumerate(top_results[:3]):  # Print only top 3 for brevity
@@ -437,8 +1033,6 @@ class RAGChatbot:
                       " | Matching: " + matching_terms)
         except UnicodeEncodeError:
             print("\nFound relevant documents (display error)")
-        
-        return top_results
 
     def is_summary_request(self, question):
         """Check if the user's question is asking for a summary"""
@@ -470,7 +1064,20 @@ class RAGChatbot:
         if not context_results:
             return "No relevant documents found to summarize."
         
-        # Prepare context
+        # Use the call_gemini_api method we already have
+        return self.call_gemini_api(self.build_summary_prompt(context_results, question, method))
+
+    def pack_context(self, context_results):
+        """Trim retrieved excerpts to the context token budget, returning (results, tokens used)"""
+        return pack_contexts(context_results, self.context_token_budget)
+
+    def build_summary_prompt(self, context_results, question, method="standard"):
+        """Build the Gemini prompt for a summary using the given method"""
+        if method == "map_reduce":
+            return self.build_map_reduce_prompt(context_results, question)
+        
+        # Prepare context within the token budget
+        context_results, _ = self.pack_context(context_results)
         all_texts = []
         for result in context_results:
             all_texts.extend(result['contexts'])
@@ -527,17 +1134,153 @@ Your summary should:
         }
         
         # Get the appropriate prompt
-        prompt = summary_prompts[method]
+        return summary_prompts[method]
+
+    def group_chunks(self, chunks, max_tokens):
+        """Split (id, text) chunks into consecutive groups of at most max_tokens estimated tokens"""
+        groups = []
+        current = []
+        used = 0
+        for chunk_id, text in chunks:
+            cost = estimate_tokens(text)
+            if current and used + cost > max_tokens:
+                groups.append(current)
+                current = []
+                used = 0
+            current.append((chunk_id, text))
+            used += cost
+        if current:
+            groups.append(current)
+        return groups
+
+    def summarize_group(self, group, kind="map"):
+        """Summarize one group of chunks or partial summaries, reusing the cached summary when the group was seen before"""
+        key = self.summary_cache.make_key(group, self.gemini_model, kind)
+        summary = self.summary_cache.get(key)
+        if summary is None:
+            combined_text = "\n\n".join(text for _, text in group)
+            if kind == "map":
+                prompt = f"""Summarize the following excerpts from a legal document:
+
+{combined_text}
+
+Keep the parties, facts, legal issues, holdings, dates and citations. Be concise and do not add information that is not in the text."""
+            else:
+                prompt = f"""Combine the following partial summaries of a legal document into one summary:
+
+{combined_text}
+
+Keep the parties, facts, legal issues, holdings, dates and citations, and remove repetition."""
+            summary = self.call_gemini_api(prompt)
+            if not summary.startswith("Error"):
+                self.summary_cache.put(key, self.gemini_model, summary)
+        return summary
+
+    def document_chunks(self, namespace, source):
+        """Every chunk of one document as retrieval results, in page order"""
+        store_namespace = self.store_location(namespace)[0]
+        results = []
+        for matches, _ in self.export_vectors(namespace, filter={"source": {"$eq": source}}):
+            texts = self.docstore.get_many(store_namespace, [match.id for match in matches])
+            for match in matches:
+                metadata = match.metadata or {}
+                text = metadata.get('text') or texts.get(match.id)
+                if text:
+                    results.append({
+                        "id": match.id,
+                        "namespace": namespace,
+                        "score": 0.0,
+                        "matching_terms": ["whole document"],
+                        "text": text,
+                        "contexts": [text],
+                        "source": source,
+                        "order": (metadata.get("page", 0), metadata.get("chunk_id", 0))
+                    })
+        results.sort(key=lambda result: result.pop("order"))
+        return results
+
+    def whole_document_results(self, context_results, query):
+        """
+        Widen the chunks of a map-reduce summary to whole documents.
         
-        # Use the call_gemini_api method we already have
-        return self.call_gemini_api(prompt)
+        When the query names exactly one retrieved document (see
+        names_document), every chunk of it replaces the retrieved chunks, so
+        a long judgment is summarized in full rather than from its top-k
+        excerpts. Otherwise every chunk of the document most of the best
+        summary_top_k results come from is added after the results from other
+        documents, which are kept. Documents over summary_document_max_chunks
+        are left as retrieved.
+        """
+        if not context_results:
+            return context_results
+        
+        query_terms = set(tokenize(query))
+        retrieved = list(dict.fromkeys((result['namespace'], result['source']) for result in context_results))
+        named = [document for document in retrieved if names_document(query_terms, document[1])]
+        if len(named) == 1:
+            namespace, source = named[0]
+            keep_others = False
+        else:
+            best = context_results[:self.summary_top_k]
+            (namespace, source), count = Counter((result['namespace'], result['source']) for result in best).most_common(1)[0]
+            if count * 2 <= len(best):
+                return context_results
+            keep_others = True
+        
+        document = self.document_chunks(namespace, source)
+        if not document or len(document) > self.summary_document_max_chunks:
+            return context_results
+        print(f"Summarizing all {len(document)} chunks of {source}")
+        if not keep_others:
+            return document
+        others = [result for result in context_results if (result['namespace'], result['source']) != (namespace, source)]
+        return others + document
 
-    def call_gemini_api(self, prompt, max_tokens=2000, temperature=0.0):
-        """Call the Gemini API with the given prompt"""
-        url_with_key = f"{self.gemini_url}?key={self.google_api_key}"
-        headers = {"Content-Type": "application/json"}
+    def build_map_reduce_prompt(self, context_results, question):
+        """
+        Run the map phase of a map-reduce summary and return the reduce prompt.
+        
+        Whole chunks are split into groups of at most summary_group_tokens,
+        each group is summarized concurrently on the summary workers, and
+        partial summaries are combined again until they fit one prompt.
+        Small inputs fall back to the standard single-prompt summary.
+        """
+        chunks = list({result['id']: (result['id'], result.get('text') or "\n".join(result['contexts']))
+                       for result in context_results}.values())
+        if sum(estimate_tokens(text) for _, text in chunks) <= self.summary_group_tokens:
+            return self.build_summary_prompt(context_results, question, method="standard")
+        
+        kind = "map"
+        while True:
+            groups = self.group_chunks(chunks, self.summary_group_tokens)
+            if kind != "map" and len(groups) == 1:
+                break
+            print(f"Summarizing {len(chunks)} {'chunks' if kind == 'map' else 'partial summaries'} in {len(groups)} groups...")
+            with METRICS.span("summary_map"):
+                summaries = list(self.summary_executor.map(lambda group: self.summarize_group(group, kind), groups))
+            summaries = [summary for summary in summaries if not summary.startswith("Error")]
+            if not summaries:
+                print("Map phase failed; falling back to the standard summary.")
+                return self.build_summary_prompt(context_results, question, method="standard")
+            
+            # Stop when summarizing no longer shrinks the input
+            shrunk = (sum(estimate_tokens(summary) for summary in summaries) <
+                      sum(estimate_tokens(text) for _, text in chunks))
+            chunks = [(f"{kind}-{i}", summary) for i, summary in enumerate(summaries)]
+            kind = "combine"
+            if not shrunk:
+                break
         
-        payload = {
+        combined_text = "\n\n".join(text for _, text in chunks)
+        return f"""The following are partial summaries of legal documents relevant to this request: "{question}"
+
+{combined_text}
+
+Combine them into one comprehensive, well-structured summary that covers the main legal points and addresses the request. Remove repetition and do not add information that is not in the partial summaries."""
+
+    def gemini_payload(self, prompt, max_tokens=2000, temperature=0.0):
+        """Request body for a Gemini generation call"""
+        return {
             "contents": [{"parts": [{"text": prompt}]}],
             "generationConfig": {
                 "temperature": temperature,
@@ -546,36 +1289,111 @@ Your summary should:
                 "topK": 64
             }
         }
+
+    def parse_gemini_response(self, response_json):
+        """Extract the answer text from a Gemini response body"""
+        if 'candidates' in response_json and len(response_json['candidates']) > 0:
+            if 'content' in response_json['candidates'][0]:
+                content = response_json['candidates'][0]['content']
+                if 'parts' in content and len(content['parts']) > 0:
+                    return content['parts'][0]['text']
+        
+        return "Error: Unable to extract text from Gemini API response."
+
+    @METRICS.timed("gemini")
+    def call_gemini_api(self, prompt, max_tokens=2000, temperature=0.0, deadline=None):
+        """Call the Gemini API with the given prompt, giving up at the deadline if one is given"""
+        url_with_key = f"{self.gemini_url}?key={self.google_api_key}"
+        headers = {"Content-Type": "application/json"}
+        payload = self.gemini_payload(prompt, max_tokens, temperature)
         
         try:
-            response = requests.post(url_with_key, headers=headers, json=payload)
+            response = self.gemini_client.post(url_with_key, headers=headers, json=payload, deadline=deadline)
             response.raise_for_status()
+            return self.parse_gemini_response(response.json())
+        except requests.exceptions.HTTPError:
+            return self.format_gemini_error(response)
+        except requests.exceptions.RequestException as e:
+            return f"Error from Gemini API: {str(e)}"
+
+    async def acall_gemini_api(self, prompt, max_tokens=2000, temperature=0.0, deadline=None):
+        """Async variant of call_gemini_api that does not block the event loop"""
+        url_with_key = f"{self.gemini_url}?key={self.google_api_key}"
+        headers = {"Content-Type": "application/json"}
+        payload = self.gemini_payload(prompt, max_tokens, temperature)
+        
+        with METRICS.span("gemini"):
+            try:
+                response = await self.async_gemini_client.post(url_with_key, headers=headers, json=payload, deadline=deadline)
+            except httpx.HTTPError as e:
+                return f"Error from Gemini API: {str(e)}"
+            if response.status_code != 200:
+                return self.format_gemini_error(response)
+            return self.parse_gemini_response(response.json())
+
+    def format_gemini_error(self, response):
+        """Turn a failed Gemini HTTP response into a readable error message"""
+        if response.status_code == 401:
+            return "Error: Invalid Gemini API key. Please check your credentials."
+        else:
+            error_message = response.text
+            try:
+                error_json = json.loads(error_message)
+                if 'error' in error_json and 'message' in error_json['error']:
+                    error_message = error_json['error']['message']
+            except:
+                pass
+            return f"Error from Gemini API: {error_message}"
+
+    def call_gemini_api_stream(self, prompt, max_tokens=2000, temperature=0.0, deadline=None, stats=None):
+        """
+        Call the streaming Gemini endpoint and yield answer text as it is generated.
+        
+        A deadline bounds the wait for the response to start streaming. Errors
+        are yielded as text; when a stats dict is passed it also gets
+        failed=True, so a half-streamed answer can be told apart from a
+        complete one.
+        """
+        url_with_key = f"{self.gemini_stream_url}?alt=sse&key={self.google_api_key}"
+        headers = {"Content-Type": "application/json"}
+        payload = self.gemini_payload(prompt, max_tokens, temperature)
+        
+        start_time = time.perf_counter()
+        first_token = True
+        try:
+            response = self.gemini_client.post(url_with_key, headers=headers, json=payload, stream=True, deadline=deadline)
+            if response.status_code != 200:
+                if stats is not None:
+                    stats["failed"] = True
+                yield self.format_gemini_error(response)
+                return
             
-            response_json = response.json()
-            
-            # Extract text from Gemini response format
-            if 'candidates' in response_json and len(response_json['candidates']) > 0:
-                if 'content' in response_json['candidates'][0]:
-                    content = response_json['candidates'][0]['content']
-                    if 'parts' in content and len(content['parts']) > 0:
-                        return content['parts'][0]['text']
-            
-            return "Error: Unable to extract text from Gemini API response."
-        except requests.exceptions.HTTPError as e:
-            if response.status_code == 401:
-                return "Error: Invalid Gemini API key. Please check your credentials."
-            else:
-                error_message = response.text
-                try:
-                    error_json = json.loads(error_message)
-                    if 'error' in error_json and 'message' in error_json['error']:
-                        error_message = error_json['error']['message']
-                except:
-                    pass
-                return f"Error from Gemini API: {error_message}"
+            # Server-sent events: one JSON candidate chunk per "data:" line. The stream is
+            # UTF-8 JSON, but without a charset requests would decode it as ISO-8859-1
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                chunk = json.loads(line[len("data:"):].strip())
+                for candidate in chunk.get('candidates', [])[:1]:
+                    for part in candidate.get('content', {}).get('parts', []):
+                        text = part.get('text')
+                        if text:
+                            if first_token:
+                                METRICS.observe("gemini_first_token", time.perf_counter() - start_time)
+                                first_token = False
+                            yield text
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if stats is not None:
+                stats["failed"] = True
+            yield f"Error from Gemini API: {str(e)}"
+        finally:
+            METRICS.observe("gemini_stream", time.perf_counter() - start_time)
 
-    def chat_with_gemini(self, context_results, question):
-        """Enhanced chat completion with better context formatting"""
+    def build_chat_prompt(self, context_results, question):
+        """Build the Gemini prompt for answering a question from retrieved context"""
+        # Keep the best excerpts that fit the token budget
+        context_results, _ = self.pack_context(context_results)
         if not context_results:
             context_str = "No relevant documents found in the knowledge base."
             sources_str = ""
@@ -622,9 +1440,17 @@ Instructions:
 
 Answer:"""
         
-        # Call Gemini API
-        return self.call_gemini_api(prompt)
+        return prompt
+
+    def chat_with_gemini(self, context_results, question):
+        """Enhanced chat completion with better context formatting"""
+        return self.call_gemini_api(self.build_chat_prompt(context_results, question))
+
+    def chat_with_gemini_stream(self, context_results, question):
+        """Streaming variant of chat_with_gemini that yields the answer in chunks"""
+        return self.call_gemini_api_stream(self.build_chat_prompt(context_results, question))
 
+    @METRICS.timed("chat")
     def chat(self, query: str):
         """Process a user query and return a response"""
             # Check if it's a general conversation query first
@@ -633,21 +1459,311 @@ Answer:"""
             return {
                 "answer": self.get_general_response(category),
                 "sources": [],
-                "contexts": []
+                "contexts": [],
+                "context_tokens": 0
             }
 
-        # Check if this is a summary request
-        if self.is_summary_request(query):
+        is_summary = self.is_summary_request(query)
+        mode = "summary" if is_summary else "qa"
+
+        # Summaries of a named document are looked up rather than generated
+        if is_summary:
+            precomputed = self.document_summary_response(query)
+            if precomputed is not None:
+                return precomputed
+
+        # The latency budget starts before the first embedding or index call
+        deadline = Deadline(self.chat_deadline)
+        retrieval_deadline = self.retrieval_deadline(deadline)
+
+        # Serve paraphrases of previously answered questions from the answer cache
+        cached, cache_key = self.lookup_answer_cache(query, mode, retrieval_deadline)
+        if cached is not None:
+            return cached
+
+        response = self.answer_query(query, is_summary, deadline, retrieval_deadline)
+        self.store_answer_cache(cache_key, response)
+        return response
+
+    async def achat(self, query: str):
+        """
+        Async variant of chat.
+        
+        Embedding, namespace queries and generation are all awaited, so one
+        process can serve many in-flight questions without a thread each.
+        """
+        with METRICS.span("chat"):
+            is_general, category = self.is_general_query(query)
+            if is_general:
+                return {
+                    "answer": self.get_general_response(category),
+                    "sources": [],
+                    "contexts": [],
+                    "context_tokens": 0
+                }
+
+            is_summary = self.is_summary_request(query)
+            mode = "summary" if is_summary else "qa"
+
+            if is_summary:
+                precomputed = self.document_summary_response(query)
+                if precomputed is not None:
+                    return precomputed
+
+            deadline = Deadline(self.chat_deadline)
+            retrieval_deadline = self.retrieval_deadline(deadline)
+            cached, cache_key = await self.alookup_answer_cache(query, mode, retrieval_deadline)
+            if cached is not None:
+                return cached
+
+            prepared = await self.aprepare_answer(query, is_summary, retrieval_deadline)
+            if prepared["prompt"] is None:
+                answer = prepared["answer"]
+            else:
+                answer = await self.acall_gemini_api(prepared["prompt"], deadline=self.generation_deadline(deadline))
+
+            response = {
+                "answer": answer,
+                "sources": prepared["sources"],
+                "contexts": prepared["contexts"],
+                "context_tokens": prepared["context_tokens"],
+                "retrieval_path": prepared["retrieval_path"],
+                "partial": prepared["partial"]
+            }
+            self.store_answer_cache(cache_key, response)
+            return response
+
+    def chat_stream(self, query: str):
+        """
+        Process a user query like chat, but stream the answer.
+        
+        Retrieval runs before this returns; generation is lazy. The returned
+        dict carries sources and contexts plus "answer_stream", a generator of
+        answer text chunks from Gemini's streaming endpoint.
+        """
+        is_general, category = self.is_general_query(query)
+        if is_general:
+            return {
+                "answer_stream": iter([self.get_general_response(category)]),
+                "sources": [],
+                "contexts": [],
+                "context_tokens": 0
+            }
+
+        is_summary = self.is_summary_request(query)
+        mode = "summary" if is_summary else "qa"
+
+        if is_summary:
+            precomputed = self.document_summary_response(query)
+            if precomputed is not None:
+                precomputed["answer_stream"] = iter([precomputed.pop("answer")])
+                return precomputed
+
+        deadline = Deadline(self.chat_deadline)
+        retrieval_deadline = self.retrieval_deadline(deadline)
+        cached, cache_key = self.lookup_answer_cache(query, mode, retrieval_deadline)
+        if cached is not None:
+            cached["answer_stream"] = iter([cached.pop("answer")])
+            return cached
+
+        prepared = self.prepare_answer(query, is_summary, retrieval_deadline)
+
+        def answer_stream():
+            if prepared["prompt"] is None:
+                yield prepared["answer"]
+                return
+            parts = []
+            stream_stats = {}
+            for text in self.call_gemini_api_stream(prepared["prompt"], deadline=self.generation_deadline(deadline),
+                                                    stats=stream_stats):
+                parts.append(text)
+                yield text
+            # An answer cut off by a broken stream ends in an error message and is not cached
+            if stream_stats.get("failed"):
+                return
+            self.store_answer_cache(cache_key, {
+                "answer": "".join(parts),
+                "sources": prepared["sources"],
+                "contexts": prepared["contexts"],
+                "context_tokens": prepared["context_tokens"],
+                "retrieval_path": prepared["retrieval_path"],
+                "partial": prepared["partial"]
+            })
+
+        return {
+            "answer_stream": answer_stream(),
+            "sources": prepared["sources"],
+            "contexts": prepared["contexts"],
+            "context_tokens": prepared["context_tokens"],
+            "retrieval_path": prepared["retrieval_path"],
+            "partial": prepared["partial"]
+        }
+
+    def document_summary_response(self, query):
+        """Answer a summary request that names one document from its precomputed summary, or return None"""
+        found = self.document_summaries.find(query)
+        if found is None:
+            return None
+
+        namespace, source, summary = found
+        try:
+            print("\nServing precomputed summary of " + source + ".")
+        except UnicodeEncodeError:
+            print("\nServing precomputed document summary.")
+        return {
+            "answer": summary,
+            "sources": [{"file": source, "namespace": namespace}],
+            "contexts": [summary],
+            "context_tokens": 0
+        }
+
+    def answer_cache_versions(self):
+        """
+        Per-namespace data versions cached answers are checked against.
+        
+        The catalogue's vector counts are cached for NAMESPACE_CACHE_TTL, so
+        each is paired with the namespace's local keyword index statistics,
+        which change as soon as an upload is indexed, even by another process.
+        Uploads indexed on another machine are only seen once the catalogue
+        reloads.
+        """
+        counts = self.get_namespace_counts()
+        versions = self.keyword_index.namespace_versions()
+        return {namespace: (counts.get(namespace), versions.get(namespace)) for namespace in set(counts) | set(versions)}
+
+    def lookup_answer_cache(self, query, mode, deadline=None):
+        """Return (cached response or None, key for storing the answer later); skipped if embedding misses the vector stage deadline"""
+        if self.answer_cache.max_entries <= 0:
+            return None, None
+
+        namespace_counts = self.answer_cache_versions()
+        embeddings = self.embed_before([query], (deadline or NO_DEADLINE).stage(self.vector_stage_timeout))
+        if embeddings is None:
+            print("Deadline reached: skipping the answer cache lookup")
+            return None, None
+        query_embedding = embeddings[0]
+        cached = self.answer_cache.lookup(query_embedding, namespace_counts, mode=mode)
+        if cached is not None:
+            print("\nServing answer from the semantic answer cache.")
+        return cached, (query_embedding, namespace_counts, mode)
+
+    async def alookup_answer_cache(self, query, mode, deadline=None):
+        """Async variant of lookup_answer_cache"""
+        if self.answer_cache.max_entries <= 0:
+            return None, None
+
+        namespace_counts = await self.run_blocking(self.answer_cache_versions)
+        embeddings = await self.aembed_before([query], (deadline or NO_DEADLINE).stage(self.vector_stage_timeout))
+        if embeddings is None:
+            print("Deadline reached: skipping the answer cache lookup")
+            return None, None
+        query_embedding = embeddings[0]
+        cached = self.answer_cache.lookup(query_embedding, namespace_counts, mode=mode)
+        if cached is not None:
+            print("\nServing answer from the semantic answer cache.")
+        return cached, (query_embedding, namespace_counts, mode)
+
+    def store_answer_cache(self, cache_key, response):
+        """Cache a grounded answer; failures, empty and partial retrievals are not cached"""
+        if (cache_key is None or not response["contexts"] or response["answer"].startswith("Error")
+                or response.get("partial")):
+            return
+        query_embedding, namespace_counts, mode = cache_key
+        self.answer_cache.store(query_embedding, namespace_counts, response, mode=mode)
+
+    def answer_query(self, query, is_summary=False, deadline=None, retrieval_deadline=None):
+        """
+        Retrieve context and generate an answer with Gemini, within the deadline if one is given.
+        
+        Retrieval stops at retrieval_deadline (by default its share of the
+        deadline) so generation keeps a share of the budget.
+        """
+        deadline = deadline or NO_DEADLINE
+        prepared = self.prepare_answer(query, is_summary, retrieval_deadline or self.retrieval_deadline(deadline))
+        if prepared["prompt"] is None:
+            answer = prepared["answer"]
+        else:
+            answer = self.call_gemini_api(prepared["prompt"], deadline=self.generation_deadline(deadline))
+
+        return {
+            "answer": answer,
+            "sources": prepared["sources"],
+            "contexts": prepared["contexts"],
+            "context_tokens": prepared["context_tokens"],
+            "retrieval_path": prepared["retrieval_path"],
+            "partial": prepared["partial"]
+        }
+
+    def prepare_answer(self, query, is_summary=False, deadline=None):
+        """
+        Retrieve context for a query and build its Gemini prompt.
+        
+        Returns a dict with the prompt, sources and contexts. When there is
+        nothing to send to Gemini, prompt is None and answer holds the reply.
+        partial is True when retrieval stopped at a deadline before every
+        search finished.
+        """
+        if is_summary:
             try:
-                print("\nDetected summary request. Using standard summary method.")
+                print(f"\nDetected summary request. Using {self.summary_method} summary method.")
             except UnicodeEncodeError:
                 print("\nDetected summary request.")
 
-            # Get context using our advanced retrieval
-            context_results = self.retrieve_context(query, top_k=10)
+        # Get context using our advanced retrieval
+        stats = {}
+        context_results = self.retrieve_context(query, top_k=self.answer_top_k(is_summary), stats=stats,
+                                                deadline=deadline)
+        prepared = self.package_answer(query, is_summary, context_results)
+        prepared["retrieval_path"] = stats.get("retrieval_path")
+        prepared["partial"] = stats.get("partial", False)
+        return prepared
 
-            # Generate a standard summary
-            answer = self.get_summary_with_method(context_results, query, method="standard")
+    async def aprepare_answer(self, query, is_summary=False, deadline=None):
+        """Async variant of prepare_answer"""
+        if is_summary:
+            try:
+                print(f"\nDetected summary request. Using {self.summary_method} summary method.")
+            except UnicodeEncodeError:
+                print("\nDetected summary request.")
+
+        stats = {}
+        context_results = await self.aretrieve_context(query, top_k=self.answer_top_k(is_summary), stats=stats,
+                                                       deadline=deadline)
+        if is_summary:
+            # A map-reduce summary calls Gemini while building its prompt
+            prepared = await self.run_blocking(self.package_answer, query, is_summary, context_results)
+        else:
+            prepared = self.package_answer(query, is_summary, context_results)
+        prepared["retrieval_path"] = stats.get("retrieval_path")
+        prepared["partial"] = stats.get("partial", False)
+        return prepared
+
+    def answer_top_k(self, is_summary):
+        """Number of chunks to retrieve for a question or summary request"""
+        if not is_summary:
+            return 5
+        return self.map_reduce_top_k if self.summary_method == "map_reduce" else self.summary_top_k
+
+    def package_answer(self, query, is_summary, context_results):
+        """Build the prompt, sources and contexts for retrieved context (see prepare_answer)"""
+        if is_summary and self.summary_method == "map_reduce":
+            # Map-reduce bounds each of its prompts, so whole chunks (of a whole document if one dominates) are summarized
+            context_results = self.whole_document_results(context_results, query)
+            context_tokens = sum(estimate_tokens(result.get('text', '')) for result in context_results)
+        else:
+            # Fit the retrieved excerpts into the prompt's token budget
+            context_results, context_tokens = self.pack_context(context_results)
+            if context_results:
+                print(f"Packed {len(context_results)} documents into ~{context_tokens} context tokens "
+                      f"(budget {self.context_token_budget})")
+
+        # Check if this is a summary request
+        if is_summary:
+            # Build a standard summary prompt
+            if context_results:
+                prompt = self.build_summary_prompt(context_results, query, method=self.summary_method)
+            else:
+                prompt = None
 
         # Format sources
             sources = []
@@ -668,24 +1784,25 @@ Answer:"""
                     contexts.append(context_piece)
 
             return {
-                "answer": answer,
+                "prompt": prompt,
+                "answer": "No relevant documents found to summarize.",
                 "sources": sources,
-                "contexts": contexts
+                "contexts": contexts,
+                "context_tokens": context_tokens
             }
 
         else:
-            # Use our improved retrieval for regular queries
-            context_results = self.retrieve_context(query, top_k=5)
-
             if not context_results:
                 return {
+                    "prompt": None,
                     "answer": "I couldn't find any relevant information in the available documents. Could you please rephrase your question or provide more context?",
                     "sources": [],
-                    "contexts": []
+                    "contexts": [],
+                    "context_tokens": 0
                 }
 
-            # Get answer using enhanced chat function
-            answer = self.chat_with_gemini(context_results, query)
+            # Build the prompt for the enhanced chat function
+            prompt = self.build_chat_prompt(context_results, query)
 
             # Format sources
             sources = []
@@ -714,9 +1831,11 @@ Answer:"""
                     contexts.append(context_piece)
 
             return {
-                "answer": answer,
+                "prompt": prompt,
+                "answer": None,
                 "sources": sources,
-                "contexts": contexts
+                "contexts": contexts,
+                "context_tokens": context_tokens
             }
 
 
@@ -729,7 +1848,7 @@ def main():
     available_namespaces = chatbot.list_namespaces()
     
     if not available_namespaces:
-        print("\n⚠️ Warning: No document namespaces found in the Pinecone index.")
+        print("\n⚠️ Warning: No document namespaces found in the vector store.")
         print("Please make sure documents have been properly indexed using the embedding script.")
         print("The chatbot will continue but may not find relevant answers without indexed documents.")
     else:
@@ -754,9 +1873,11 @@ def main():
             
         try:
             # Measure retrieval and response time
+            stages_before = METRICS.snapshot()
             start_time = time.time()
             response = chatbot.chat(query)
             total_time = time.time() - start_time
+            stages_after = METRICS.snapshot()
             
             print("\nAI Paralegal:", response["answer"])
             
@@ -771,10 +1892,27 @@ def main():
                     except UnicodeEncodeError:
                         print("- [Source with special characters]")
             
+            if response.get("context_tokens"):
+                print("\n(Context tokens: ~" + str(response["context_tokens"]) + ")")
+            
+            if response.get("retrieval_path"):
+                print("(Retrieval path: " + response["retrieval_path"] + ")")
+            
+            if response.get("partial"):
+                print("(Partial answer: some searches did not finish within the time limit)")
+            
             try:
                 print("\n(Processing time: " + str(round(total_time, 2)) + "s)")
             except UnicodeEncodeError:
                 print("\n(Processing time calculation error)")
+            
+            # Time spent in each pipeline stage for this question
+            print("Stage timings:")
+            for stage, histogram in stages_after.items():
+                before = stages_before.get(stage, {"count": 0, "sum": 0.0})
+                calls = histogram["count"] - before["count"]
+                if calls:
+                    print(f"  {stage}: {histogram['sum'] - before['sum']:.3f}s over {calls} call(s)")
         except Exception as e:
             try:
                 print("\n❌ Error: " + str(e))
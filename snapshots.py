@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import numpy as np
+
+SNAPSHOT_VERSION = 1
+
+# File extensions written as Arrow IPC (memory-mappable) instead of Parquet
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+
+
+def _pyarrow():
+    """Import pyarrow, which only snapshots need"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Namespace snapshots need pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def is_arrow_path(path):
+    """Whether a snapshot path uses the Arrow IPC format rather than Parquet"""
+    return os.path.splitext(path)[1].lower() in ARROW_EXTENSIONS
+
+
+def snapshot_schema(pa, dimension, info):
+    """Columnar layout of a snapshot: one row per vector, info kept in the schema metadata"""
+    return pa.schema([
+        ("id", pa.string()),
+        ("values", pa.list_(pa.float32(), dimension)),
+        ("metadata", pa.string()),
+        ("text", pa.string())
+    ], metadata={"paralegal_snapshot": json.dumps(info)})
+
+
+def write_snapshot(path, batches, dimension, info=None):
+    """
+    Write a namespace snapshot.
+
+    Parquet (zstd) is used unless the path ends in .arrow/.feather/.ipc, in
+    which case an uncompressed Arrow IPC file is written that can be memory
+    mapped when read back. Batches are written as they arrive and the file
+    only replaces path once complete.
+
+    Args:
+        path: Output file
+        batches: Iterable of lists of (id, values, metadata dict, text) records
+        dimension: Vector dimension
+        info: Extra snapshot info (e.g. namespace, embedding model)
+
+    Returns:
+        int: Number of vectors written
+    """
+    pa = _pyarrow()
+    info = dict(info or {}, version=SNAPSHOT_VERSION, dimension=dimension, created=time.time())
+    schema = snapshot_schema(pa, dimension, info)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    temp_path = path + ".tmp"
+    if is_arrow_path(path):
+        writer = pa.ipc.new_file(temp_path, schema)
+    else:
+        writer = pa.parquet.ParquetWriter(temp_path, schema, compression="zstd")
+
+    rows = 0
+    try:
+        for records in batches:
+            if not records:
+                continue
+            values = np.asarray([record[1] for record in records], dtype=np.float32).reshape(-1)
+            writer.write_table(pa.Table.from_arrays([
+                pa.array([record[0] for record in records], pa.string()),
+                pa.FixedSizeListArray.from_arrays(pa.array(values, pa.float32()), dimension),
+                pa.array([json.dumps(record[2] or {}) for record in records], pa.string()),
+                pa.array([record[3] or "" for record in records], pa.string())
+            ], schema=schema))
+            rows += len(records)
+        writer.close()
+    except BaseException:
+        writer.close()
+        os.remove(temp_path)
+        raise
+
+    os.replace(temp_path, path)
+    return rows
+
+
+def _open(path, batch_size=1000):
+    """Return the Arrow schema and an iterator of record batches of a snapshot file"""
+    pa = _pyarrow()
+    if is_arrow_path(path):
+        # Memory mapped: column buffers are read straight from the page cache
+        reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+        return reader.schema, (reader.get_batch(i) for i in range(reader.num_record_batches))
+    parquet_file = pa.parquet.ParquetFile(path, memory_map=True)
+    return parquet_file.schema_arrow, parquet_file.iter_batches(batch_size=batch_size)
+
+
+def snapshot_info(path):
+    """Return the info stored with a snapshot (namespace, dimension, version, ...)"""
+    schema, _ = _open(path)
+    return json.loads((schema.metadata or {}).get(b"paralegal_snapshot", b"{}"))
+
+
+def read_snapshot(path, batch_size=100):
+    """
+    Stream the records of a snapshot in batches.
+
+    Yields:
+        tuple: (ids, values float32 matrix, metadata dicts, texts) for up to
+        batch_size vectors; for Arrow IPC files the matrix is a view of the
+        memory-mapped file
+    """
+    schema, batches = _open(path, batch_size)
+    dimension = schema.field("values").type.list_size
+
+    for batch in batches:
+        for start in range(0, batch.num_rows, batch_size):
+            part = batch.slice(start, batch_size)
+            values = part.column(1).flatten().to_numpy(zero_copy_only=False).reshape(-1, dimension)
+            yield (
+                part.column(0).to_pylist(),
+                values,
+                [json.loads(metadata) for metadata in part.column(2).to_pylist()],
+                part.column(3).to_pylist()
+            )
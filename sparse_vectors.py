@@ -0,0 +1,75 @@
+import zlib
+from collections import Counter
+from keyword_index import tokenize
+
+# BM25 parameters, matching KeywordIndex
+K1 = 1.5
+B = 0.75
+
+
+def term_index(term):
+    """Stable 32-bit sparse dimension for a term"""
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def _sparse(weights):
+    """Build Pinecone-style sparse values from a dict of index -> weight"""
+    indices = sorted(weights)
+    return {"indices": indices, "values": [float(weights[i]) for i in indices]}
+
+
+def encode_document(text, avg_length, k1=K1, b=B):
+    """
+    Sparse BM25 term-frequency vector of a chunk.
+
+    Each term weighs tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length)),
+    so its dot product with an IDF-weighted query vector is the chunk's BM25 score.
+    """
+    terms = tokenize(text or "")
+    if not terms:
+        return None
+    norm = k1 * (1 - b + b * len(terms) / (avg_length or len(terms)))
+    weights = Counter()
+    for term, tf in Counter(terms).items():
+        weights[term_index(term)] += tf * (k1 + 1) / (tf + norm)
+    return _sparse(weights)
+
+
+def encode_query(query_terms, idf=None, k1=K1):
+    """
+    Sparse IDF-weighted query vector.
+
+    Weights are divided by the best BM25 score any chunk could reach, so
+    sparse scores fall in [0, 1) like KeywordIndex.search scores. Without
+    idf statistics every term weighs 1.0; with them, terms missing from
+    idf (absent from the corpus) are dropped.
+    """
+    terms = set()
+    for term in query_terms:
+        terms.update(tokenize(term))
+    if not terms:
+        return None
+
+    weights = Counter()
+    for term in terms:
+        weights[term_index(term)] += 1.0 if idf is None else idf.get(term, 0.0)
+    max_score = sum(weights.values()) * (k1 + 1)
+    if max_score <= 0:
+        return None
+    return _sparse({index: weight / max_score for index, weight in weights.items() if weight > 0})
+
+
+def hybrid_scale(dense, sparse, alpha):
+    """Weight a dense and a sparse query vector for a convex hybrid score: alpha * dense + (1 - alpha) * sparse"""
+    scaled_dense = [value * alpha for value in dense]
+    if sparse is None:
+        return scaled_dense, None
+    return scaled_dense, {"indices": sparse["indices"], "values": [value * (1 - alpha) for value in sparse["values"]]}
+
+
+def sparse_dot(query, document):
+    """Dot product of two sparse vectors"""
+    if not query or not document:
+        return 0.0
+    weights = dict(zip(query["indices"], query["values"]))
+    return sum(weights.get(index, 0.0) * value for index, value in zip(document["indices"], document["values"]))
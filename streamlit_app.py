@@ -9,7 +9,7 @@ from doc_draft import (
     AnnexureRequest, WitnessStatementRequest, ExhibitRequest,
     ForensicReportRequest, ExpertOpinionRequest
 )
-from embeddings import process_uploaded_file
+from embeddings import process_uploaded_file, INGEST_SUMMARIES
 
 # Set page configuration
 st.set_page_config(
@@ -364,22 +364,30 @@ elif st.session_state.current_tab == "Chat":
         # Add user message to chat history
         st.session_state.chat_history.append({"role": "user", "content": user_input})
         
-        # Get response from chatbot
-        with st.spinner("AI Paralegal is thinking..."):
-            try:
-                response = chatbot.chat(user_input)
+        # Get response from chatbot, rendering the answer as it streams in
+        try:
+            with st.spinner("AI Paralegal is searching the documents..."):
+                response = chatbot.chat_stream(user_input)
+            
+            answer_placeholder = st.empty()
+            answer_text = ""
+            for chunk in response["answer_stream"]:
+                answer_text += chunk
+                answer_placeholder.markdown(f"""
+                <div class='chat-message assistant-message'>
+                    <div class='sender'>AI Paralegal:</div>
+                    <div class='message-content legal-text'>{clean_legal_text(answer_text)}</div>
+                </div>
+                """, unsafe_allow_html=True)
+            
+            if not answer_text:
+                answer_text = "Error: Received an empty response. Please try again."
                 
-                # Make sure response is properly formatted even if it contains an error
-                if isinstance(response, dict) and "answer" in response:
-                    answer_text = response["answer"]
-                else:
-                    answer_text = "Error: Received an invalid response format. Please try again."
-                    
-                # Add assistant response to chat history
-                st.session_state.chat_history.append({"role": "assistant", "content": answer_text})
-            except Exception as e:
-                error_message = f"Error processing your request: {str(e)}"
-                st.session_state.chat_history.append({"role": "assistant", "content": error_message})
+            # Add assistant response to chat history
+            st.session_state.chat_history.append({"role": "assistant", "content": answer_text})
+        except Exception as e:
+            error_message = f"Error processing your request: {str(e)}"
+            st.session_state.chat_history.append({"role": "assistant", "content": error_message})
         
         # Rerun to update the UI
         st.rerun()
@@ -995,17 +1003,20 @@ elif st.session_state.current_tab == "Knowledge Base":
     
     # First display available namespaces
     st.markdown("### Available Document Collections")
-    namespaces = chatbot.list_namespaces()
+    namespaces = chatbot.get_namespace_counts()
     if namespaces:
         # Create a dataframe for better display
         namespace_list = []
-        for ns in namespaces:
-            namespace_list.append({"Document Name": ns})
+        for ns, count in namespaces.items():
+            namespace_list.append({"Document Name": ns, "Chunks": count})
         
         # Display as a table with improved styling
         st.dataframe(
             namespace_list,
-            column_config={"Document Name": st.column_config.TextColumn("Document Name")},
+            column_config={
+                "Document Name": st.column_config.TextColumn("Document Name"),
+                "Chunks": st.column_config.NumberColumn("Chunks")
+            },
             use_container_width=True,
             hide_index=True
         )
@@ -1044,6 +1055,12 @@ elif st.session_state.current_tab == "Knowledge Base":
             help="Enter a prefix for all documents. Each file will use this prefix plus its filename."
         )
     
+    precompute_summaries = st.checkbox(
+        "Precompute document summaries",
+        value=INGEST_SUMMARIES,
+        help="Summarize each document by page range and as a whole while processing, so summary requests that name the document are answered instantly."
+    )
+    
     # Process uploaded files
     if uploaded_files:
         st.write(f"Selected {len(uploaded_files)} file(s):")
@@ -1070,7 +1087,7 @@ elif st.session_state.current_tab == "Knowledge Base":
                     else:  # Add prefix
                         custom_ns = f"{custom_input}_{file.name}" if custom_input else file.name
                         
-                    result = process_uploaded_file(file, custom_ns)
+                    result = process_uploaded_file(file, custom_ns, summarize=precompute_summaries)
                     results.append(result)
                     
                     # Update progress
@@ -1087,6 +1104,9 @@ elif st.session_state.current_tab == "Knowledge Base":
                 # Complete the progress bar
                 progress_bar.progress(1.0)
                 status_text.text("Processing complete!")
+                
+                # Pick up the new namespaces and vector counts
+                chatbot.refresh_namespaces()
     
     # Display upload status 
     if st.session_state.upload_status:
@@ -0,0 +1,72 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Local directory for on-disk retrieval data (indexes, caches)
+DATA_DIR = os.getenv("PARALEGAL_DATA_DIR", "index_data")
+DEFAULT_SUMMARY_CACHE_PATH = os.path.join(DATA_DIR, "summary_cache.sqlite")
+
+
+class SummaryCache:
+    """
+    SQLite cache of intermediate summaries for map-reduce summarization.
+
+    Entries are keyed on a hash of the exact set of chunks summarized (their
+    IDs and texts), the model and the prompt kind, so summarizing the same
+    document again reuses every partial summary while any change to the
+    chunks produces a new key.
+    """
+
+    def __init__(self, path=DEFAULT_SUMMARY_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, model TEXT, summary TEXT, created REAL)"
+            )
+
+    def make_key(self, chunks, model, kind="map"):
+        """Build the cache key for a set of (id, text) chunks"""
+        digest = hashlib.sha256(f"{model}\x00{kind}".encode("utf-8"))
+        for chunk_id, text in sorted(chunks):
+            digest.update(f"\x00{chunk_id}\x00{text}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached summary for a key, or None"""
+        with self.lock:
+            row = self.conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model, summary):
+        """Store a summary"""
+        with self.lock:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO summaries (key, model, summary, created) VALUES (?, ?, ?, ?)",
+                    (key, model, summary, time.time())
+                )
+
+    def stats(self):
+        """Return hit/miss counters"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,52 @@
+from rag_chatbot import RAGChatbot
+
+
+def chunk(chunk_id, namespace, source, text):
+    return {"id": chunk_id, "namespace": namespace, "source": source, "score": 0.5,
+            "matching_terms": [], "text": text, "contexts": [text]}
+
+
+def make_bot(documents):
+    """A chatbot with only what whole_document_results needs; documents maps (namespace, source) to chunks"""
+    bot = RAGChatbot.__new__(RAGChatbot)
+    bot.summary_top_k = 10
+    bot.summary_document_max_chunks = 500
+    bot.document_chunks = lambda namespace, source: list(documents[(namespace, source)])
+    return bot
+
+
+DOCUMENTS = {
+    ("judgments", "a.pdf"): [chunk(f"a{i}", "judgments", "a.pdf", f"Limitation appeal point {i}") for i in range(4)],
+    ("judgments", "b.pdf"): [chunk(f"b{i}", "judgments", "b.pdf", f"Income tax point {i}") for i in range(3)],
+    ("judgments", "DN_Singh_vs_Commissioner_of_Income_Tax.pdf"): [
+        chunk(f"dn{i}", "judgments", "DN_Singh_vs_Commissioner_of_Income_Tax.pdf", f"Reopening point {i}") for i in range(5)
+    ],
+}
+
+
+def test_other_documents_survive_whole_document_expansion():
+    bot = make_bot(DOCUMENTS)
+    retrieved = DOCUMENTS[("judgments", "a.pdf")][:3] + DOCUMENTS[("judgments", "b.pdf")][:1]
+
+    results = bot.whole_document_results(retrieved, "summarize the limitation appeal and income tax points")
+
+    ids = [result["id"] for result in results]
+    assert "b0" in ids
+    assert sorted(ids) == ["a0", "a1", "a2", "a3", "b0"]
+
+
+def test_named_document_is_summarized_in_full():
+    bot = make_bot(DOCUMENTS)
+    dn_singh = DOCUMENTS[("judgments", "DN_Singh_vs_Commissioner_of_Income_Tax.pdf")]
+    retrieved = dn_singh[:2] + DOCUMENTS[("judgments", "b.pdf")][:2]
+
+    results = bot.whole_document_results(retrieved, "summarize the DN Singh judgment")
+
+    assert [result["id"] for result in results] == [f"dn{i}" for i in range(5)]
+
+
+def test_results_from_several_documents_are_kept_without_a_majority():
+    bot = make_bot(DOCUMENTS)
+    retrieved = DOCUMENTS[("judgments", "a.pdf")][:2] + DOCUMENTS[("judgments", "b.pdf")][:2]
+
+    assert bot.whole_document_results(retrieved, "summarize the points") == retrieved
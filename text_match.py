@@ -0,0 +1,88 @@
+from collections import deque
+from functools import lru_cache
+
+
+class MultiPatternMatcher:
+    """
+    Aho-Corasick automaton over a set of lowercase terms.
+
+    All occurrences of every term are found in a single sweep over the text,
+    instead of one str.find scan per term.
+    """
+
+    def __init__(self, terms):
+        self.terms = list(dict.fromkeys(term.lower() for term in terms if term))
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        # Trie of all terms
+        for index, term in enumerate(self.terms):
+            state = 0
+            for char in term:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(index)
+
+        # Failure links, breadth first
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find_all(self, text):
+        """Return (start, end, term) for every occurrence in the lowercased text"""
+        occurrences = []
+        state = 0
+        for position, char in enumerate(text.lower()):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for index in self.output[state]:
+                term = self.terms[index]
+                occurrences.append((position - len(term) + 1, position + 1, term))
+        return occurrences
+
+    def extract(self, text, radius=200):
+        """
+        Find matching terms and context snippets in one pass.
+
+        Windows of radius characters around each occurrence are merged when
+        they overlap, so every returned snippet is a distinct span of text.
+
+        Returns:
+            tuple: (set of matched lowercase terms, list of snippets in text order)
+        """
+        occurrences = self.find_all(text)
+        found = {term for _, _, term in occurrences}
+        spans = merge_windows(occurrences, len(text), radius)
+        return found, [text[start:end] for start, end in spans]
+
+
+def merge_windows(occurrences, text_length, radius=200):
+    """Merge overlapping context windows around (start, end, term) occurrences into spans"""
+    spans = []
+    for start, end, _ in sorted(occurrences):
+        window_start = max(0, start - radius)
+        window_end = min(text_length, end + radius)
+        if spans and window_start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], window_end)
+        else:
+            spans.append([window_start, window_end])
+    return [(start, end) for start, end in spans]
+
+
+@lru_cache(maxsize=128)
+def get_matcher(terms):
+    """Build (or reuse) the automaton for a tuple of terms"""
+    return MultiPatternMatcher(terms)
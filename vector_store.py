@@ -0,0 +1,691 @@
+import os
+import json
+import hashlib
+import shutil
+import threading
+import numpy as np
+from sparse_vectors import sparse_dot
+from hnsw_index import HNSWIndex
+
+# Local directory for on-disk retrieval data (indexes, caches)
+DATA_DIR = os.getenv("PARALEGAL_DATA_DIR", "index_data")
+DEFAULT_LOCAL_PATH = os.path.join(DATA_DIR, "vectors")
+
+INDEX_NAME = "ipd"
+VECTOR_DIMENSION = 768  # Standard for embedding-004
+
+
+class Match:
+    """A vector returned by a query or fetch"""
+
+    __slots__ = ("id", "score", "values", "metadata")
+
+    def __init__(self, id, score=0.0, values=None, metadata=None):
+        self.id = id
+        self.score = score
+        self.values = values
+        self.metadata = metadata
+
+    def __repr__(self):
+        return f"Match(id={self.id!r}, score={self.score:.4f})"
+
+
+class QueryResult:
+    """Matches of a query, best first"""
+
+    def __init__(self, matches):
+        self.matches = matches
+
+
+def matches_filter(metadata, filter):
+    """Evaluate a Pinecone-style metadata filter ($eq, $ne, $in, $nin, $and, $or) against metadata"""
+    if not filter:
+        return True
+    metadata = metadata or {}
+
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class VectorStore:
+    """
+    Interface shared by the vector store backends.
+
+    Vectors are (id, values, metadata) tuples grouped into namespaces, the
+    same model Pinecone uses, so callers can switch backends freely. A
+    fourth element may carry sparse values ({"indices": [...], "values": [...]})
+    for hybrid search.
+    """
+
+    def upsert(self, vectors, namespace):
+        """Insert or overwrite (id, values, metadata[, sparse_values]) tuples in a namespace"""
+        raise NotImplementedError
+
+    def query(self, vector, namespace, top_k=10, include_metadata=True, include_values=False, filter=None,
+              sparse_vector=None):
+        """
+        Return a QueryResult with the top_k most similar vectors of a namespace.
+
+        With sparse_vector the score is the hybrid dot product: dense plus
+        sparse, with both query parts already weighted by the caller.
+        """
+        raise NotImplementedError
+
+    def fetch(self, ids, namespace):
+        """Return a dict of id -> Match for the requested IDs that exist"""
+        raise NotImplementedError
+
+    def list_namespaces(self):
+        """Return a dict of namespace names and their vector counts"""
+        raise NotImplementedError
+
+    def list_ids(self, namespace, limit=100, pagination_token=None, prefix=None):
+        """Return (page of up to limit vector IDs, starting with prefix if given, token for the next page or None when done)"""
+        raise NotImplementedError
+
+    def delete(self, ids=None, namespace=None, delete_all=False):
+        """Delete vectors by ID, or every vector of a namespace with delete_all"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Persist any index state that is buffered in memory"""
+        pass
+
+    def export(self, namespace, batch_size=100, cursor=None, include_values=True, filter=None, progress=None,
+               prefix=None):
+        """
+        Stream every vector of a namespace as (matches, cursor) batches.
+
+        Each page of listed IDs is fetched in one request, so memory stays
+        bounded by batch_size whatever the namespace size. The cursor yielded
+        with a batch resumes the export right after it (None after the last
+        batch); pass it back as cursor to continue an interrupted export.
+        Metadata filters are applied to the fetched vectors, while an ID
+        prefix narrows the listing itself, so only matching IDs are fetched.
+
+        Args:
+            namespace: Namespace to export
+            batch_size: IDs listed and fetched per request
+            cursor: Cursor of a previous export to resume from
+            include_values: Keep the dense values of each match
+            filter: Pinecone-style metadata filter
+            progress: Optional callable taking (vectors exported so far, cursor)
+            prefix: Only export IDs starting with this prefix
+        """
+        exported = 0
+        while True:
+            ids, next_cursor = self.list_ids(namespace, limit=batch_size, pagination_token=cursor, prefix=prefix)
+            matches = []
+            if ids:
+                fetched = self.fetch(ids, namespace)
+                for vector_id in ids:
+                    match = fetched.get(vector_id)
+                    if match is None or not matches_filter(match.metadata, filter):
+                        continue
+                    if not include_values:
+                        match.values = None
+                    matches.append(match)
+            cursor = next_cursor
+            exported += len(matches)
+            if progress is not None:
+                progress(exported, cursor)
+            if matches:
+                yield matches, cursor
+            if not cursor:
+                return
+
+
+class PineconeVectorStore(VectorStore):
+    """VectorStore backed by a Pinecone index"""
+
+    def __init__(self, api_key=None, index_name=INDEX_NAME):
+        import pinecone
+
+        self.pc = pinecone.Pinecone(
+            api_key=api_key or os.getenv("PINECONE_API_KEY"),
+            environment='us-east1'
+        )
+        self.index_name = index_name
+        self.index = self.pc.Index(index_name)
+
+    def upsert(self, vectors, namespace):
+        vectors = [
+            {"id": v[0], "values": v[1], "metadata": v[2], "sparse_values": v[3]} if len(v) > 3 and v[3] else v[:3]
+            for v in vectors
+        ]
+        self.index.upsert(vectors=vectors, namespace=namespace)
+
+    def query(self, vector, namespace, top_k=10, include_metadata=True, include_values=False, filter=None,
+              sparse_vector=None):
+        params = {
+            "vector": vector,
+            "namespace": namespace,
+            "top_k": top_k,
+            "include_metadata": include_metadata,
+            "include_values": include_values
+        }
+        if filter:
+            params["filter"] = filter
+        if sparse_vector:
+            # Hybrid queries need an index created with the dotproduct metric
+            params["sparse_vector"] = sparse_vector
+        result = self.index.query(**params)
+        return QueryResult([
+            Match(m.id, m.score, m.values if include_values else None, m.metadata)
+            for m in result.matches
+        ])
+
+    def fetch(self, ids, namespace):
+        result = self.index.fetch(ids=list(ids), namespace=namespace)
+        return {
+            vector_id: Match(vector_id, 0.0, vector.values, vector.metadata)
+            for vector_id, vector in result.vectors.items()
+        }
+
+    def list_namespaces(self):
+        stats = self.index.describe_index_stats()
+        return {ns: info.vector_count for ns, info in stats.namespaces.items()}
+
+    def list_ids(self, namespace, limit=100, pagination_token=None, prefix=None):
+        params = {"namespace": namespace, "limit": limit}
+        if pagination_token:
+            params["pagination_token"] = pagination_token
+        if prefix:
+            params["prefix"] = prefix
+        result = self.index.list_paginated(**params)
+        next_token = result.pagination.next if result.pagination else None
+        return [vector.id for vector in result.vectors], next_token
+
+    def delete(self, ids=None, namespace=None, delete_all=False):
+        if delete_all:
+            self.index.delete(delete_all=True, namespace=namespace)
+        else:
+            self.index.delete(ids=list(ids), namespace=namespace)
+
+
+def _file_stamp(path):
+    """(inode, mtime, size) of a file, or None when it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class _LocalNamespace:
+    """
+    Vectors of one namespace: a memory-mapped float32 matrix plus IDs and metadata.
+
+    IDs, metadata and sparse values live in meta.json plus an append-only
+    meta.log of row changes, so a write costs the size of its batch rather
+    than of the namespace. The log is folded back into meta.json once it
+    holds as many entries as the namespace has rows. Every access first
+    catches up on log entries written by other store instances, and reloads
+    from disk when meta.json was rewritten under it.
+    """
+
+    # Log entries tolerated before compaction, whatever the namespace size
+    MIN_COMPACT_ENTRIES = 1000
+
+    def __init__(self, directory, name, dimension, hnsw_params=None):
+        self.directory = directory
+        self.name = name
+        self.dimension = dimension
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.log_path = os.path.join(directory, "meta.log")
+        self.hnsw_path = os.path.join(directory, "hnsw.npz")
+        self.hnsw_params = hnsw_params
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Read the namespace from disk"""
+        self.hnsw = None
+        self.hnsw_dirty = False
+
+        # Row-aligned IDs (None marks a deleted row), metadata and sparse values
+        self.ids = []
+        self.metadata = []
+        self.sparse = []
+        self.meta_stamp = _file_stamp(self.meta_path)
+        if self.meta_stamp is not None:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.ids = meta["ids"]
+            self.metadata = meta["metadata"]
+            self.sparse = meta.get("sparse") or [None] * len(self.ids)
+        self.rows = {vector_id: row for row, vector_id in enumerate(self.ids) if vector_id is not None}
+
+        self.log_stamp = _file_stamp(self.log_path)
+        self.log_offset = 0
+        self.log_entries = 0
+        self._replay_log()
+
+        self.norm_buffer = np.zeros(0, dtype=np.float32)
+        self._sync_matrix(range(len(self.ids)))
+
+        if self.hnsw_params is not None:
+            self._open_hnsw(self.hnsw_params)
+
+    def _refresh(self):
+        """Pick up changes other store instances made to the namespace on disk"""
+        log_stamp = _file_stamp(self.log_path)
+        if (_file_stamp(self.meta_path) != self.meta_stamp
+                or (log_stamp and log_stamp[0]) != (self.log_stamp and self.log_stamp[0])
+                or (log_stamp and log_stamp[2] < self.log_offset)):
+            # meta.json was rewritten or the log replaced: start over from the files
+            self._load()
+            return
+        if log_stamp is None or log_stamp[2] == self.log_offset:
+            return
+
+        first_new_row = len(self.ids)
+        touched = self._replay_log()
+        self._sync_matrix(touched)
+        if self.hnsw is not None and touched:
+            for row in sorted(set(touched)):
+                if row >= first_new_row:
+                    self.hnsw.add(self.matrix[row])
+                elif self.ids[row] is not None:
+                    self.hnsw.update(row, self.matrix[row])
+                if self.ids[row] is None:
+                    self.hnsw.mark_deleted(row)
+            self.hnsw_dirty = True
+
+    def _open_hnsw(self, params):
+        """Load the namespace's HNSW graph, adding any rows written since it was last saved"""
+        if os.path.exists(self.hnsw_path):
+            self.hnsw = HNSWIndex.load(self.hnsw_path, ef_search=params.get("ef_search"))
+        else:
+            self.hnsw = HNSWIndex(self.dimension, **params)
+
+        if self.hnsw.count < len(self.ids):
+            print(f"Building HNSW index for namespace {self.name} ({len(self.ids) - self.hnsw.count} vectors)...")
+            for row in range(self.hnsw.count, len(self.ids)):
+                self.hnsw.add(self.matrix[row])
+            self.hnsw_dirty = True
+
+        # Rows deleted after the graph was saved
+        for row, vector_id in enumerate(self.ids):
+            if vector_id is None and row not in self.hnsw.deleted:
+                self.hnsw.mark_deleted(row)
+                self.hnsw_dirty = True
+
+    def _apply(self, entry):
+        """Apply one logged row change: a new row, an overwrite, or a deletion (id None)"""
+        row, vector_id = entry["row"], entry["id"]
+        if row == len(self.ids):
+            self.ids.append(None)
+            self.metadata.append({})
+            self.sparse.append(None)
+        old_id = self.ids[row]
+        if old_id is not None and self.rows.get(old_id) == row:
+            del self.rows[old_id]
+
+        self.ids[row] = vector_id
+        self.metadata[row] = entry.get("metadata") or {}
+        self.sparse[row] = entry.get("sparse")
+        if vector_id is not None:
+            self.rows[vector_id] = row
+
+    def _replay_log(self):
+        """Apply the complete log entries written after log_offset and return the rows they touched"""
+        if not os.path.exists(self.log_path):
+            return []
+        with open(self.log_path, "rb") as f:
+            f.seek(self.log_offset)
+            data = f.read()
+        # A line still being written by another process is picked up next time
+        data = data[:data.rfind(b"\n") + 1]
+
+        touched = []
+        for line in data.splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                self._apply(entry)
+                touched.append(entry["row"])
+        self.log_offset += len(data)
+        self.log_entries += len(touched)
+        return touched
+
+    def _write_log(self, entries):
+        """Append row changes to the log, folding it into meta.json once it gets long"""
+        if self.meta_stamp is None:
+            # New namespace: the first write creates meta.json, which already holds these rows
+            self._compact()
+            return
+        data = "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+        with open(self.log_path, "ab") as f:
+            f.write(data)
+        self.log_offset += len(data)
+        self.log_entries += len(entries)
+        self.log_stamp = _file_stamp(self.log_path)
+        if self.log_entries > max(self.MIN_COMPACT_ENTRIES, len(self.ids)):
+            self._compact()
+
+    def _compact(self):
+        """Atomically write IDs and metadata to meta.json and start an empty log"""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            meta = {"namespace": self.name, "ids": self.ids, "metadata": self.metadata}
+            if any(self.sparse):
+                meta["sparse"] = self.sparse
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+        # Replaced rather than truncated, so other readers see a new file
+        open(tmp_path, "wb").close()
+        os.replace(tmp_path, self.log_path)
+        self.meta_stamp = _file_stamp(self.meta_path)
+        self.log_stamp = _file_stamp(self.log_path)
+        self.log_offset = 0
+        self.log_entries = 0
+
+    def _sync_matrix(self, rows):
+        """Memory-map the vector file at its current row count and recompute the norms of the given rows"""
+        count = len(self.ids)
+        if count and os.path.exists(self.vectors_path):
+            self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                    shape=(count, self.dimension))
+        else:
+            self.matrix = np.zeros((0, self.dimension), dtype=np.float32)
+
+        # Norms live in a buffer grown by doubling, so appends do not copy every row's norm
+        if count > len(self.norm_buffer):
+            buffer = np.zeros(max(count, 2 * len(self.norm_buffer)), dtype=np.float32)
+            buffer[:len(self.norm_buffer)] = self.norm_buffer
+            self.norm_buffer = buffer
+        self.norms = self.norm_buffer[:count]
+
+        rows = np.fromiter(sorted(set(rows)), dtype=np.int64)
+        if len(rows) and len(self.matrix):
+            live = np.array([self.ids[row] is not None for row in rows], dtype=bool)
+            self.norms[rows] = np.where(live, np.linalg.norm(self.matrix[rows], axis=1), 0.0)
+
+    def count(self):
+        with self.lock:
+            self._refresh()
+            return len(self.rows)
+
+    def upsert(self, vectors):
+        with self.lock:
+            self._refresh()
+            self._upsert(vectors)
+
+    def _upsert(self, vectors):
+        os.makedirs(self.directory, exist_ok=True)
+        # A batch naming an ID twice keeps its last copy, as Pinecone does
+        vectors = list({vector[0]: vector for vector in vectors}.values())
+        entries = []
+        updates = []
+        appends = []
+        for vector_id, values, metadata, *sparse in vectors:
+            row_values = np.asarray(values, dtype=np.float32)
+            row = self.rows.get(vector_id)
+            if row is None:
+                row = len(self.ids) + len(appends)
+                appends.append(row_values)
+            else:
+                updates.append((row, row_values))
+            entries.append({"row": row, "id": vector_id, "metadata": metadata or {},
+                            "sparse": sparse[0] if sparse else None})
+
+        # Vectors are written before the log entries that refer to them; release the read-only map first
+        self.matrix = None
+        if updates:
+            matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r+",
+                               shape=(len(self.ids), self.dimension))
+            for row, row_values in updates:
+                matrix[row] = row_values
+            matrix.flush()
+            del matrix
+        if appends:
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.stack(appends).astype(np.float32).tobytes())
+
+        for entry in entries:
+            self._apply(entry)
+        self._write_log(entries)
+        self._sync_matrix(entry["row"] for entry in entries)
+
+        # Graph node numbers follow matrix rows
+        if self.hnsw is not None:
+            for row, row_values in updates:
+                self.hnsw.update(row, row_values)
+            self.hnsw.add_items(appends)
+            self.hnsw_dirty = True
+
+    def query(self, vector, top_k, include_metadata, include_values, filter, ef_search=None, sparse_vector=None):
+        with self.lock:
+            self._refresh()
+            return self._query(vector, top_k, include_metadata, include_values, filter, ef_search, sparse_vector)
+
+    def _match(self, row, score, include_metadata, include_values):
+        return Match(
+            self.ids[row],
+            score,
+            self.matrix[row].tolist() if include_values else None,
+            self.metadata[row] if include_metadata else None
+        )
+
+    def _query(self, vector, top_k, include_metadata, include_values, filter, ef_search, sparse_vector=None):
+        if not self.rows:
+            return []
+
+        # Approximate search through the HNSW graph when one is configured (dense queries only)
+        if self.hnsw is not None and not sparse_vector:
+            allowed = None
+            if filter:
+                allowed = np.array([matches_filter(meta, filter) for meta in self.metadata], dtype=bool)
+                allowed &= self.norms > 0
+            found = self.hnsw.search(vector, top_k, ef_search=ef_search, allowed=allowed)
+            wanted = min(top_k, len(self.rows) if allowed is None else int(allowed.sum()))
+            # Very selective filters can starve the graph walk; fall back to exact search then
+            if len(found) >= wanted:
+                return [self._match(row, float(score), include_metadata, include_values) for row, score in found]
+
+        query = np.asarray(vector, dtype=np.float32)
+        if sparse_vector:
+            # Hybrid: dot product with normalized rows keeps the caller's dense weighting
+            scores = np.divide(self.matrix @ query, self.norms,
+                               out=np.zeros(len(self.ids), dtype=np.float32), where=self.norms > 0)
+            scores += np.array([sparse_dot(sparse_vector, row_sparse) for row_sparse in self.sparse], dtype=np.float32)
+        else:
+            query_norm = np.linalg.norm(query)
+            denominators = self.norms * query_norm
+            scores = np.divide(self.matrix @ query, denominators,
+                               out=np.zeros(len(self.ids), dtype=np.float32), where=denominators > 0)
+
+        # Deleted rows and rows rejected by the filter never match
+        valid = self.norms > 0
+        if filter:
+            valid &= np.array([matches_filter(meta, filter) for meta in self.metadata], dtype=bool)
+        scores = np.where(valid, scores, -np.inf)
+
+        candidates = int(valid.sum())
+        k = min(top_k, candidates)
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [self._match(row, float(scores[row]), include_metadata, include_values) for row in top]
+
+    def fetch(self, ids):
+        with self.lock:
+            self._refresh()
+            return self._fetch(ids)
+
+    def _fetch(self, ids):
+        found = {}
+        for vector_id in ids:
+            row = self.rows.get(vector_id)
+            if row is not None:
+                found[vector_id] = Match(vector_id, 0.0, self.matrix[row].tolist(), self.metadata[row])
+        return found
+
+    def list_ids(self, offset, limit, prefix=None):
+        with self.lock:
+            self._refresh()
+            page = []
+            while offset < len(self.ids) and len(page) < limit:
+                vector_id = self.ids[offset]
+                if vector_id is not None and (not prefix or vector_id.startswith(prefix)):
+                    page.append(vector_id)
+                offset += 1
+            return page, (str(offset) if offset < len(self.ids) else None)
+
+    def delete(self, ids):
+        with self.lock:
+            self._refresh()
+            entries = []
+            for vector_id in dict.fromkeys(ids):
+                row = self.rows.get(vector_id)
+                if row is not None:
+                    entries.append({"row": row, "id": None})
+                    if self.hnsw is not None:
+                        self.hnsw.mark_deleted(row)
+                        self.hnsw_dirty = True
+            if not entries:
+                return
+            for entry in entries:
+                self._apply(entry)
+            self._write_log(entries)
+            self._sync_matrix(entry["row"] for entry in entries)
+
+    def flush(self):
+        with self.lock:
+            if self.hnsw is not None and self.hnsw_dirty:
+                self.hnsw.save(self.hnsw_path)
+                self.hnsw_dirty = False
+
+
+class LocalVectorStore(VectorStore):
+    """
+    VectorStore kept on the local disk for air-gapped deployments and load tests.
+
+    Each namespace is a memory-mapped float32 matrix; queries compute exact
+    cosine top-k with one vectorized NumPy matrix-vector product. With
+    ann="hnsw" each namespace also keeps an HNSW graph and queries walk it
+    instead, trading recall for latency through ef_search.
+    """
+
+    def __init__(self, root=DEFAULT_LOCAL_PATH, dimension=VECTOR_DIMENSION, ann=None,
+                 M=16, ef_construction=100, ef_search=64):
+        self.root = root
+        self.dimension = dimension
+        self.ann = ann
+        self.hnsw_params = {"M": M, "ef_construction": ef_construction, "ef_search": ef_search}
+        self.ef_search = ef_search
+        self.namespaces = {}
+        self.lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+
+    def _directory(self, namespace):
+        """Namespace names are file names, so directories are keyed by their hash"""
+        return os.path.join(self.root, hashlib.sha1(namespace.encode("utf-8")).hexdigest())
+
+    def _namespace(self, namespace, create=False):
+        with self.lock:
+            if namespace not in self.namespaces:
+                directory = self._directory(namespace)
+                if not os.path.isdir(directory):
+                    if not create:
+                        return None
+                    os.makedirs(directory)
+                hnsw_params = self.hnsw_params if self.ann == "hnsw" else None
+                self.namespaces[namespace] = _LocalNamespace(directory, namespace, self.dimension, hnsw_params)
+            return self.namespaces[namespace]
+
+    def upsert(self, vectors, namespace):
+        with self.lock:
+            self._namespace(namespace, create=True).upsert(vectors)
+
+    def query(self, vector, namespace, top_k=10, include_metadata=True, include_values=False, filter=None,
+              sparse_vector=None):
+        store = self._namespace(namespace)
+        if store is None:
+            return QueryResult([])
+        return QueryResult(store.query(vector, top_k, include_metadata, include_values, filter, self.ef_search,
+                                       sparse_vector))
+
+    def fetch(self, ids, namespace):
+        store = self._namespace(namespace)
+        return store.fetch(ids) if store else {}
+
+    def list_namespaces(self):
+        counts = {}
+        with self.lock:
+            loaded = {os.path.basename(store.directory): name for name, store in self.namespaces.items()}
+        for entry in os.listdir(self.root):
+            meta_path = os.path.join(self.root, entry, "meta.json")
+            if not os.path.exists(meta_path):
+                continue
+            name = loaded.get(entry)
+            if name is None:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    name = json.load(f)["namespace"]
+            # Counts include rows still only in the namespace's log
+            store = self._namespace(name)
+            count = store.count() if store else 0
+            if count:
+                counts[name] = count
+        return counts
+
+    def list_ids(self, namespace, limit=100, pagination_token=None, prefix=None):
+        store = self._namespace(namespace)
+        if store is None:
+            return [], None
+        # Tokens are row offsets into the namespace
+        return store.list_ids(int(pagination_token or 0), limit, prefix)
+
+    def delete(self, ids=None, namespace=None, delete_all=False):
+        with self.lock:
+            if delete_all:
+                self.namespaces.pop(namespace, None)
+                shutil.rmtree(self._directory(namespace), ignore_errors=True)
+                return
+            store = self._namespace(namespace)
+            if store:
+                store.delete(ids)
+
+    def flush(self):
+        with self.lock:
+            for store in self.namespaces.values():
+                store.flush()
+
+
+def get_vector_store(backend=None):
+    """Create the vector store selected by the VECTOR_STORE setting ("pinecone" or "local")"""
+    backend = (backend or os.getenv("VECTOR_STORE", "pinecone")).lower()
+    if backend == "local":
+        return LocalVectorStore(
+            ann=os.getenv("LOCAL_ANN") or None,
+            M=int(os.getenv("HNSW_M", "16")),
+            ef_construction=int(os.getenv("HNSW_EF_CONSTRUCTION", "100")),
+            ef_search=int(os.getenv("HNSW_EF_SEARCH", "64"))
+        )
+    if backend == "pinecone":
+        return PineconeVectorStore()
+    raise ValueError(f"Unknown vector store backend: {backend}")